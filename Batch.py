@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import CaptureFrame_Process
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+"""
+Get the list of videos to process from a directory or a manifest file.
+A manifest is a text file with one video path per line, relative paths are relative to the manifest.
+Empty lines and lines starting with # are ignored, and a video that is listed more than once is only processed once.
+
+Inputs:(One)
+    1. batch_path: path to a directory of videos or to a manifest file
+    type: string
+Outputs:(One)
+    1. videos: paths of the videos to process
+    type: list(string)
+"""
+def read_batch(batch_path):
+    if os.path.isdir(batch_path):
+        return [os.path.join(batch_path, f) for f in sorted(os.listdir(batch_path))
+                if f.lower().endswith(VIDEO_EXTENSIONS)]
+    videos = []
+    listed = set()
+    base = os.path.dirname(batch_path)
+    with open(batch_path) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            video = line if os.path.isabs(line) else os.path.join(base, line)
+            if os.path.abspath(video) not in listed:
+                listed.add(os.path.abspath(video))
+                videos.append(video)
+    return videos
+
+
+"""
+Get the paths of the output csv files of the videos in the output directory.
+A csv file is named after its video, videos with the same name in different directories
+get a short hash of their path appended so they do not overwrite each other.
+
+Inputs:(Two)
+    1. videos: paths of the videos
+    type: list(string)
+    2. output_dir: directory to save the csv files to
+    type: string
+Outputs:(One)
+    1. save_paths: path of the csv file of each video
+    type: list(string)
+"""
+def output_paths(videos, output_dir):
+    names = [os.path.splitext(os.path.basename(video))[0] for video in videos]
+    save_paths = []
+    for video, name in zip(videos, names):
+        if names.count(name) > 1:
+            name += "_" + hashlib.sha1(os.path.abspath(video).encode()).hexdigest()[:8]
+        save_paths.append(os.path.join(output_dir, name + ".csv"))
+    return save_paths
+
+
+"""
+Process a single video of a batch, in a worker process
+
+Inputs:(Four)
+    1. video: path of the video
+    type: string
+    2. save_path: path to save the csv file to
+    type: string
+    3. sample_frequency: how often a frame should be taken
+    type: int
+    4. options: how to run the pipeline
+    type: Options
+Outputs:(One)
+    1. summary: video path, csv path, wall time in seconds, amount of plates found and error (empty)
+    type: list
+"""
+def process_video(video, save_path, sample_frequency, options):
+    tic = time.perf_counter()
+    recognized = CaptureFrame_Process.CaptureFrame_Process(video, sample_frequency, save_path, options)
+    toc = time.perf_counter()
+    plates_found = sum(len(plates) for plates in recognized.values())
+    return [video, save_path if plates_found > 0 else '', toc - tic, plates_found, '']
+
+
+"""
+Process all videos of a batch in one long-lived pool of worker processes, so interpreter start-up,
+imports and the reference characters are only paid once per worker.
+Writes a csv file per video and a summary.csv with the wall time and amount of plates found per video.
+A video that fails is listed in the summary with its error, and the other videos are still processed.
+
+Inputs:(Five)
+    1. videos: paths of the videos to process
+    type: list(string)
+    2. output_dir: directory to save the csv files to
+    type: string
+    3. sample_frequency: how often a frame should be taken
+    type: int
+    4. options: how to run the pipeline
+    type: Options
+    5. workers: amount of worker processes
+    type: int
+Outputs:(One)
+    1. summary: table with a row per video
+    type: pandas DataFrame
+"""
+def run_batch(videos, output_dir, sample_frequency, options, workers):
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_video, video, save_path, sample_frequency, options)
+                   for video, save_path in zip(videos, output_paths(videos, output_dir))]
+        data = []
+        for video, future in zip(videos, futures):
+            try:
+                data.append(future.result())
+            except Exception as e:
+                print("Failed to process " + video + ": " + repr(e))
+                data.append([video, '', float('nan'), 0, repr(e)])
+    cols = ['Video', 'Output', 'Wall time(seconds)', 'Plates found', 'Error']
+    summary = pd.DataFrame(data, columns=cols)
+    summary_path = os.path.join(output_dir, "summary.csv")
+    summary.to_csv(summary_path, index=False)
+    print(summary.to_string(index=False))
+    print('Saved batch summary to: ' + summary_path)
+    return summary
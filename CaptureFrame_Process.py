@@ -4,6 +4,19 @@ import pandas as pd
 import Localization
 import Recognize
 import Scenes
+import Pipeline
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from Classes import Options, AdaptiveSampler, FrameGate, PlateTracker, RecognitionCache
+
+
+# stride from which seeking to the sampled frames is cheaper than grabbing every frame,
+# seeking decodes from the previous keyframe so this depends on the keyframe interval of the videos
+SEEK_MIN_STRIDE = 64
+
+# maximum amount of frames whose plate images are kept and recognized in one batch,
+# so memory does not grow with the length of a scene
+SCENE_CHUNK_FRAMES = 32
 
 
 """
@@ -11,31 +24,31 @@ In this file, you will define your own CaptureFrame_Process funtion. In this fun
 you need three arguments: file_path(str type, the video file), sample_frequency(second), save_path(final results saving path).
 To do:
 	1. Capture the frames for the whole video by your sample_frequency, record the frame number and timestamp(seconds).
+	   Frames are decoded lazily, so only a small window of the video is in memory at any time.
 	2. Localize and recognize the plates in the frame.(Hints: need to use 'Localization.plate_detection' and 'Recognize.segmetn_and_recognize' functions)
 	3. If recognizing any plates, save them into a .csv file.(Hints: may need to use 'pandas' package)
 Inputs:(six)
 	1. file_path: video path
 	2. sample_frequency: second
 	3. save_path: final .csv file path
-Output: None
+	4. options: how to run the pipeline (serial, threaded or process, worker counts, shards), defaults to serial
+Output:(One)
+	1. recognized: map of frame numbers to the plates recognized after the majority vote (also saved to the .csv file)
 """
-def CaptureFrame_Process(file_path, sample_frequency, save_path):
-    # load video as map of frame number to image
-    frames, fps = loadFrames(file_path, sample_frequency)
+def CaptureFrame_Process(file_path, sample_frequency, save_path, options = None):
+    if options is None:
+        options = Options()
+    fps = video_fps(file_path)
 
-    # for each frame, locate list of plate images
-    # map of frame number to list of images
+    # localize plates in each frame, divide the frames into scenes based on bounding box locations
+    # and, for each plate image, segment into characters and recognize them
     tic = time.perf_counter()
-    localized = localize_plates(frames)
+    if options.shards > 1:
+        scenes, recognized = process_sharded(file_path, sample_frequency, options)
+    else:
+        scenes, recognized, _ = process_range(file_path, sample_frequency, options)
     toc = time.perf_counter()
-    print(f"Completed localization in {toc - tic:0.4f} seconds")
-
-    # divide frames into scenes based on bounding box locations
-    scenes = Scenes.frames_to_scenes(localized)
-
-    # for each plate image, segment into characters and recognize them
-    # map of frame number to list of strings
-    recognized = recognize_plates(localized)
+    print(f"Completed localization and recognition in {toc - tic:0.4f} seconds")
 
     # majority vote for each scene
     recognized = Scenes.majority_vote(recognized, scenes)
@@ -43,10 +56,319 @@ def CaptureFrame_Process(file_path, sample_frequency, save_path):
     # save plates to csv
     if len(recognized.items()) > 0:
         save_csv(recognized, save_path, fps)
+    return recognized
+
+
+"""
+Localize and recognize plates in frames one after another, in chunks of at most SCENE_CHUNK_FRAMES frames
+of one scene. Only the recognized strings and bounding boxes are kept, not the plate images.
+With the process pipeline, localization runs on a pool of worker processes.
+
+Inputs:(Four)
+    1. frames: iterable of frame number, timestamp and image
+    type: iterable of (int, float, 3D array)
+    2. options: how to run localization
+    type: Options
+    3. sampler: adaptive sampler the frames are sampled by, if any
+    type: AdaptiveSampler or None
+    4. cache: recognition cache, cleared at the start of every scene and kept across the chunks of a scene, None to recognize every plate
+    type: RecognitionCache or None
+Outputs:(Three)
+    1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
+    type: 2D list of ints
+    2. recognized: map of frame numbers to recognized plates
+    type: dictionary (int to string)
+    3. localized_bbs: map of frame numbers to the bounding boxes localized in that frame
+    type: dictionary (int to list of BoundingBox)
+"""
+def process_serial(frames, options, sampler = None, cache = None):
+    # for each frame, locate list of plate images
+    # generator of pairs of frame number and list of plate images
+    localized = localize_plates(frames, options, sampler)
+
+    scenes = []
+    recognized = {}
+    localized_bbs = {}
+    for starts_scene, chunk in Scenes.scene_chunks(localized, SCENE_CHUNK_FRAMES):
+        if starts_scene:
+            scenes.append([])
+            # plates of earlier scenes (other cars) should never be returned
+            if cache is not None:
+                cache.clear()
+        scenes[-1] += [frame_nr for frame_nr, _ in chunk]
+        localized_bbs.update((frame_nr, [bb for _, bb in plates]) for frame_nr, plates in chunk)
+        recognized.update(recognize_plates(chunk, options, cache))
+    return scenes, recognized, localized_bbs
+
+
+"""
+Localize and recognize plates with decoding, localization and recognition running as concurrent stages.
+The stages are connected by bounded queues, so memory stays bounded and OpenCV calls that release the GIL
+overlap with each other.
+
+Inputs:(Three)
+    1. frames: iterable of frame number, timestamp and image
+    type: iterable of (int, float, 3D array)
+    2. options: worker counts per stage and queue size
+    type: Options
+    3. sampler: adaptive sampler the frames are sampled by, if any.
+    While it is sparse, decoding and localization handle one frame at a time so it learns about every frame
+    before the next one is sampled. While it is dense it learns about a frame up to a few queues late.
+    type: AdaptiveSampler or None
+Outputs:(Three)
+    1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
+    type: 2D list of ints
+    2. recognized: map of frame numbers to recognized plates
+    type: dictionary (int to string)
+    3. localized_bbs: map of frame numbers to the bounding boxes localized in that frame
+    type: dictionary (int to list of BoundingBox)
+"""
+def process_threaded(frames, options, sampler = None):
+    # decode on a separate thread
+    frames = Pipeline.prefetch(frames, options.queue_size, sampler)
+
+    # localize on a pool of threads, keeping frame order
+    localized = Pipeline.ordered_map(partial(localize_frame, options=options), frames, options.localize_workers,
+                                     options.queue_size, sampler)
+    localized = detected_plates(localized, sampler)
+
+    # recognize on a pool of threads, keeping frame order
+    recognized_frames = Pipeline.ordered_map(partial(recognize_frame, options=options), localized, options.recognize_workers, options.queue_size)
+
+    recognized = {}
+    localized_bbs = {}
+
+    def collect():
+        for frame_nr, plates, recognized_plate in recognized_frames:
+            if recognized_plate is not None:
+                recognized[frame_nr] = recognized_plate
+            localized_bbs[frame_nr] = [bb for _, bb in plates]
+            yield frame_nr, plates
+
+    scenes = Scenes.frames_to_scenes(collect())
+    return scenes, recognized, localized_bbs
+
+
+"""
+Localize and recognize plates in a range of frames of a video, using the pipeline chosen in the options
+
+Inputs:(Five)
+    1. file_path: path to video file
+    type: string
+    2. sample_frequency: how often a frame should be taken
+    type: int
+    3. options: how to run the pipeline
+    type: Options
+    4. start: first frame of the range, a multiple of sample_frequency
+    type: int
+    5. end: frame after the last frame of the range, None for the end of the video
+    type: int or None
+Outputs:(Three)
+    1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
+    type: 2D list of ints
+    2. recognized: map of frame numbers to recognized plates
+    type: dictionary (int to string)
+    3. localized_bbs: map of frame numbers to the bounding boxes localized in that frame
+    type: dictionary (int to list of BoundingBox)
+"""
+def process_range(file_path, sample_frequency, options, start = 0, end = None):
+    # the strategy order and statistics of the recognition cascade are per run, not per worker process
+    Recognize.cascade.reset()
+
+    # sample sparsely while no plates are found and every sample_frequency-th frame while they are
+    sampler = None
+    if options.sampling == 'adaptive':
+        sampler = AdaptiveSampler(sample_frequency, options.sparse_stride, options.dense_patience)
+
+    # lazily decode the sampled frames, one at a time
+    frames = frame_source(file_path, sample_frequency, start=start, end=end, sampler=sampler)
+
+    # skip localization of frames that barely changed since the last localized frame
+    gate = None
+    if options.gate_threshold > 0:
+        gate = FrameGate(options.gate_threshold)
+        frames = gate_frames(frames, gate)
+
+    if options.track_interval > 0 and options.pipeline != 'serial':
+        print("Warning: tracking is only used with the serial pipeline, localizing whole frames")
+
+    # remember recognized plates by plate hash within a scene
+    cache = None
+    if options.hash_tolerance >= 0:
+        if options.pipeline == 'threaded':
+            print("Warning: the recognition cache is not used with the threaded pipeline, recognizing every plate")
+        else:
+            cache = RecognitionCache(Recognize.RECOGNITION_CACHE_ENTRIES)
+
+    if options.pipeline == 'threaded':
+        result = process_threaded(frames, options, sampler)
+    else:
+        result = process_serial(frames, options, sampler, cache)
+    if sampler is not None:
+        print("Adaptive sampling: " + str(sampler))
+    if gate is not None:
+        print("Frame gate: " + str(gate))
+    if sum(Recognize.cascade.attempts) > 0:
+        print("Recognition strategies: " + str(Recognize.cascade))
+    if cache is not None:
+        print("Recognition cache: " + str(cache))
+    return result
+
+
+"""
+Split a video into options.shards frame ranges, process each range in a separate process
+and merge the results, stitching together scenes that cross a shard boundary.
+The result is the same as processing the whole video in one go.
+
+Inputs:(Three)
+    1. file_path: path to video file
+    type: string
+    2. sample_frequency: how often a frame should be taken
+    type: int
+    3. options: amount of shards and how to run the pipeline within a shard
+    type: Options
+Outputs:(Two)
+    1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
+    type: 2D list of ints
+    2. recognized: map of frame numbers to recognized plates
+    type: dictionary (int to string)
+"""
+def process_sharded(file_path, sample_frequency, options):
+    ranges = shard_ranges(video_frame_count(file_path), sample_frequency, options.shards)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(process_range, file_path, sample_frequency, options, start, end) for start, end in ranges]
+        shards = [future.result() for future in futures]
+
+    recognized = {}
+    for _, shard_recognized, _ in shards:
+        recognized.update(shard_recognized)
+    scenes = Scenes.stitch_scenes([(shard_scenes, localized_bbs) for shard_scenes, _, localized_bbs in shards])
+    return scenes, recognized
+
+
+"""
+Divide the frames of a video into consecutive ranges of roughly equal size.
+Every range starts at a multiple of sample_frequency, so the sampled frames are the same as without sharding.
+
+Inputs:(Three)
+    1. frame_count: amount of frames in the video
+    type: int
+    2. sample_frequency: how often a frame should be taken
+    type: int
+    3. shards: amount of ranges to divide into
+    type: int
+Outputs:(One)
+    1. ranges: list of first frame and frame after the last frame of each range, the last range ends at None
+    type: list of (int, int or None)
+"""
+def shard_ranges(frame_count, sample_frequency, shards):
+    samples = (frame_count + sample_frequency - 1) // sample_frequency
+    starts = sorted(set(sample_frequency * (samples * i // shards) for i in range(shards)))
+    ends = starts[1:] + [None]
+    return list(zip(starts, ends))
+
+
+"""
+Get the amount of frames in a video, as reported by its container
+
+Inputs:(One)
+    1. file_path: path to video file
+    type: string
+Outputs:(One)
+    1. frame_count: amount of frames in the video
+    type: int
+"""
+def video_frame_count(file_path):
+    cap = cv2.VideoCapture(file_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
 
 
 """
-Load video as list of frames, given file path and sampling frequency
+Get the frame rate of a video
+
+Inputs:(One)
+    1. file_path: path to video file
+    type: string
+Outputs:(One)
+    1. fps: frames per second of the video
+    type: float
+"""
+def video_fps(file_path):
+    cap = cv2.VideoCapture(file_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps
+
+
+"""
+Lazily decode a video, yielding every sample_frequency-th frame.
+Only a single decoded frame is held at a time. Frames that are not sampled are
+only grabbed (advanced past) and never retrieved (converted to an image).
+For large strides the reader can instead seek straight to the next sampled frame,
+letting the decoder jump from the nearest keyframe.
+If a sampler is given, the stride to the next sampled frame is taken from the sampler
+each time, after the previous frame has been consumed.
+
+Inputs:(Six)
+    1. file_path: path to video file
+    type: string
+    2. sample_frequency: how often a frame should be taken (2 would mean every other frame)
+    type: int
+    3. seek: whether to seek to sampled frames instead of grabbing every frame,
+    None seeks iff sample_frequency is at least SEEK_MIN_STRIDE
+    type: boolean or None
+    4. start: frame number to start at, should be a multiple of sample_frequency
+    type: int
+    5. end: frame number to stop before, None to read until the end of the video
+    type: int or None
+    6. sampler: sampler deciding the stride to the next sampled frame, None for a fixed stride of sample_frequency
+    type: AdaptiveSampler or None
+Outputs:(One)
+    1. frames: generator of frame number, timestamp in seconds and image
+    type: generator of (int, float, 3D array)
+"""
+def frame_source(file_path, sample_frequency = 1, seek = None, start = 0, end = None, sampler = None):
+    if seek is None:
+        seek = sample_frequency >= SEEK_MIN_STRIDE
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        print("Could not load video!!!")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = start
+    next_sample = start
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    try:
+        while cap.isOpened() and (end is None or frame_count < end):
+            if seek:
+                # jump straight to the next sampled frame
+                if frame_count > start:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
+                retval, frame = cap.read()
+                if not retval:
+                    break
+                yield frame_count, frame_count / fps, frame
+                frame_count += sampler.stride if sampler is not None else sample_frequency
+                continue
+            # advance without converting the frame to an image
+            if not cap.grab():
+                break
+            if frame_count == next_sample:
+                retval, frame = cap.retrieve()
+                if not retval:
+                    break
+                yield frame_count, frame_count / fps, frame
+                next_sample += sampler.stride if sampler is not None else sample_frequency
+            frame_count += 1
+    finally:
+        cap.release()
+
+
+"""
+Load video as list of frames, given file path and sampling frequency.
+This keeps every sampled frame in memory, prefer frame_source for whole videos.
 
 Inputs:(Two)
     1. file_path: path to video file
@@ -56,66 +378,194 @@ Inputs:(Two)
 Outputs:(Two)
     1. frames: map of frame numbers to images
     type: dictionary (int to 3D array)
-    2. timestamps: map of frame numbers to timestamps
-    type: dictionary (int to float)
+    2. fps: frames per second of the video
+    type: float
 """
 def loadFrames(file_path, sample_frequency = 1):
-    cap = cv2.VideoCapture(file_path)
-    if not cap.isOpened():
-        print("Could not load video!!!")
     frames = {}
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = 0
-    while cap.isOpened():
-        retval, frame = cap.read()
-        if not retval:
-            break
-        if frame_count % sample_frequency == 0:
-            frames[frame_count] = frame
-        frame_count += 1
+    for frame_nr, _, frame in frame_source(file_path, sample_frequency):
+        frames[frame_nr] = frame
+    return frames, video_fps(file_path)
 
-    return frames, fps
 
+"""
+Given frames, localize plates in them. Frames are consumed one at a time,
+or a few at a time by a pool of worker processes if options.pipeline is 'process'.
+If options.track_interval is set (and localization is not run on processes), plates are tracked between frames.
 
+Inputs:(Three)
+    1. frames: iterable of frame number, timestamp and image
+    type: iterable of (int, float, 3D array)
+    2. options: how to run localization, defaults to serial
+    type: Options
+    3. sampler: adaptive sampler to tell whether plates were detected in each frame, if any
+    type: AdaptiveSampler or None
+Outputs:(One)
+    1. localized: generator of frame numbers and list of plate images and bounding boxes,
+    only for frames in which plates were detected, in frame order
+    type: generator of (int, list of pairs of image and BoundingBox)
 """
-Given map of frame numbers to images, localize plates in them
+def localize_plates(frames, options = None, sampler = None):
+    if options is not None and options.pipeline == 'process':
+        localized = Pipeline.localize_processes(frames, options.localize_workers, options.queue_size, options, sampler)
+    elif options is not None and options.track_interval > 0:
+        localized = localize_tracked(frames, PlateTracker(options.track_interval, options.track_padding), options)
+    else:
+        localized = map(partial(localize_frame, options=options), frames)
+    return detected_plates(localized, sampler)
 
-Inputs:(One)
-    1. frames: map of frame numbers to images
-    type: dictionary (int to 3D array)
+
+"""
+Keep only the frames in which plates were detected, telling the adaptive sampler about every frame.
+Frames that were skipped by the frame gate (localized as None) get the result of the last localized frame.
+
+Inputs:(Two)
+    1. localized: iterable of frame numbers and list of plate images and bounding boxes (or None), for every frame
+    type: iterable of (int, list of pairs of image and BoundingBox or None)
+    2. sampler: adaptive sampler to tell whether plates were detected in each frame, if any
+    type: AdaptiveSampler or None
 Outputs:(One)
-    1. localized: map of frame numbers to list of images of plates detected
-    type: dictionary (int to 4D array)
+    1. localized: generator of frame numbers and list of plate images and bounding boxes,
+    only for frames in which plates were detected
+    type: generator of (int, list of pairs of image and BoundingBox)
 """
-def localize_plates(frames):
-    localized = {}
-    for frame_nr, frame in frames.items():
-        localized_plates = Localization.plate_detection(frame)
+def detected_plates(localized, sampler = None):
+    previous_plates = []
+    for frame_nr, localized_plates in localized:
+        if localized_plates is None:
+            localized_plates = previous_plates
+        previous_plates = localized_plates
+        if sampler is not None:
+            sampler.update(len(localized_plates) > 0)
         if len(localized_plates) > 0:
-            localized[frame_nr] = localized_plates
-    return localized
+            yield frame_nr, localized_plates
 
 
 """
-Given localized plates, segment and recognize characters in them
+Localize plates in a single frame
 
-Inputs:(One)
-    1. localized: map of frame numbers to list of images
-    type: dictionary(int to list of images)
+Inputs:(Two)
+    1. frame: frame number, timestamp and image (None if the frame gate skipped it)
+    type: (int, float, 3D array or None)
+    2. options: localization options, None for the defaults
+    type: Options
+Outputs:(One)
+    1. localized: frame number and list of plate images and bounding boxes (None if the frame was skipped)
+    type: (int, list of pairs of image and BoundingBox or None)
+"""
+def localize_frame(frame, options = None):
+    frame_nr, _, image = frame
+    if image is None:
+        return frame_nr, None
+    return frame_nr, Localization.plate_detection(image, options)
+
+
+"""
+Localize plates in frames, searching only near the plates of the previous frame while a plate is being tracked.
+The whole frame is searched every tracker.full_scan_interval frames and whenever no plate is found near the previous ones.
+
+Inputs:(Three)
+    1. frames: iterable of frame number, timestamp and image (None if the frame gate skipped it)
+    type: iterable of (int, float, 3D array or None)
+    2. tracker: tracker keeping the plates of the previous frame
+    type: PlateTracker
+    3. options: localization options, None for the defaults
+    type: Options
+Outputs:(One)
+    1. localized: generator of frame number and list of plate images and bounding boxes (None if the frame was skipped)
+    type: generator of (int, list of pairs of image and BoundingBox or None)
+"""
+def localize_tracked(frames, tracker, options = None):
+    for frame_nr, _, image in frames:
+        if image is None:
+            yield frame_nr, None
+            continue
+        regions = tracker.regions(len(image), len(image[0]))
+        plates = []
+        if regions is not None:
+            plates = Localization.plate_detection_in_regions(image, regions, options)
+        # fall back to the whole frame when it is time to or the track is lost
+        full_scan = len(plates) == 0
+        if full_scan:
+            plates = Localization.plate_detection(image, options)
+        tracker.update(plates, full_scan)
+        yield frame_nr, plates
+    print("Plate tracking: " + str(tracker))
+
+
+"""
+Pass frames through a frame gate, dropping the image of frames that barely differ from the last frame that was let through,
+so localization is skipped for them and the result of the previous frame is reused.
+
+Inputs:(Two)
+    1. frames: iterable of frame number, timestamp and image
+    type: iterable of (int, float, 3D array)
+    2. gate: the frame gate to decide which frames are static
+    type: FrameGate
+Outputs:(One)
+    1. frames: generator of frame number, timestamp and image (None for static frames)
+    type: generator of (int, float, 3D array or None)
+"""
+def gate_frames(frames, gate):
+    for frame_nr, timestamp, image in frames:
+        if gate.is_static(image):
+            yield frame_nr, timestamp, None
+        else:
+            yield frame_nr, timestamp, image
+
+
+"""
+Given localized plates, segment and recognize characters in them.
+All plates are recognized in one batch, so the frames of a chunk share the character matching.
+When multiple plates of a frame are recognized, the last one is kept.
+
+Inputs:(Three)
+    1. localized: iterable of pairs of frame number and list of plate images and bounding boxes, of one scene
+    type: iterable of (int, list of pairs of image and BoundingBox)
+    2. options: recognition options, None for the defaults
+    type: Options
+    3. cache: recognition cache of the scene the plates are in, None to recognize every plate
+    type: RecognitionCache or None
 Outputs:(One)
     1. recognized: map of frame numbers to list of strings
     type: dictionary(int to list of strings)
 """
-def recognize_plates(localized):
+def recognize_plates(localized, options = None, cache = None):
+    localized = list(localized)
+    plate_imgs = [plate for _, plates in localized for plate, _ in plates]
+    recognized_plates = iter(Recognize.segment_and_recognize_batch(plate_imgs, options=options, cache=cache))
     recognized = {}
-    for frame_nr, plates in localized.items():
-        for plate, bb in plates:
-            recognized_plates = Recognize.segment_and_recognize(plate)
-            if recognized_plates is not None:
-                recognized[frame_nr] = recognized_plates.upper()
+    for frame_nr, plates in localized:
+        for _ in plates:
+            recognized_plate = next(recognized_plates)
+            if recognized_plate is not None:
+                recognized[frame_nr] = recognized_plate.upper()
     return recognized
 
 
+"""
+Segment and recognize the characters of the plates localized in a single frame.
+When multiple plates are recognized, the last one is kept.
+
+Inputs:(Two)
+    1. localized: frame number and list of plate images and bounding boxes
+    type: (int, list of pairs of image and BoundingBox)
+    2. options: recognition options, None for the defaults
+    type: Options
+Outputs:(One)
+    1. recognized: frame number, list of plate images and bounding boxes and the recognized plate
+    (None if no plate was recognized)
+    type: (int, list of pairs of image and BoundingBox, string)
+"""
+def recognize_frame(localized, options = None):
+    frame_nr, plates = localized
+    recognized_plate = None
+    for recognized_plates in Recognize.segment_and_recognize_batch([plate for plate, _ in plates], options=options):
+        if recognized_plates is not None:
+            recognized_plate = recognized_plates.upper()
+    return frame_nr, plates, recognized_plate
+
+
 """
 Convert data to csv file with columns:
     1. License plate: string of license plate recognized
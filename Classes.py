@@ -1,4 +1,8 @@
+import cv2
+import math
+import threading
 import numpy as np
+from collections import OrderedDict
 
 
 MIN_HEIGHT_RATIO = 0.5
@@ -102,3 +106,472 @@ class Group:
 			if curr_frame < min_frame:
 				min_frame = curr_frame
 		return min_frame + 1
+
+
+class Options:
+	def __init__(self, pipeline='serial', localize_workers=2, recognize_workers=2, queue_size=16, shards=1,
+				 sampling='fixed', sparse_stride=8, dense_patience=3, gate_threshold=0, track_interval=0, track_padding=0.5,
+				 localization_scale=1, deskew='hough',
+				 morphology='full', matcher='resize', prune_top_k=0, cascade='fixed', hash_tolerance=-1):
+		self.pipeline = pipeline
+		self.localize_workers = localize_workers
+		self.recognize_workers = recognize_workers
+		self.queue_size = queue_size
+		self.shards = shards
+		self.sampling = sampling
+		self.sparse_stride = sparse_stride
+		self.dense_patience = dense_patience
+		self.gate_threshold = gate_threshold
+		self.track_interval = track_interval
+		self.track_padding = track_padding
+		self.localization_scale = localization_scale
+		self.deskew = deskew
+		self.morphology = morphology
+		self.matcher = matcher
+		self.prune_top_k = prune_top_k
+		self.cascade = cascade
+		self.hash_tolerance = hash_tolerance
+
+	def __str__(self):
+		return "Options(" + ", ".join(key + ": " + str(value) for key, value in vars(self).items()) + ")"
+
+
+class AdaptiveSampler:
+	def __init__(self, dense_stride, sparse_stride, patience):
+		self.dense_stride = dense_stride
+		self.sparse_stride = sparse_stride
+		self.patience = patience
+		# amount of sampled frames since plates were last detected, start out sparse
+		self.misses = patience
+		self.stride = sparse_stride
+		self.dense_frames = 0
+		self.sparse_frames = 0
+
+	def __str__(self):
+		return "AdaptiveSampler(dense frames: " + str(self.dense_frames) + ", sparse frames: " + str(self.sparse_frames) + ")"
+
+	"""
+	Update the stride after a sampled frame has been localized. The stride becomes dense as soon as plates
+	are detected and stays dense until no plates were detected in patience sampled frames in a row.
+	
+	Inputs:(One)
+		1. found: whether plates were detected in the sampled frame
+		type: boolean
+	Outputs:(Zero)
+	"""
+	def update(self, found):
+		if self.stride == self.dense_stride:
+			self.dense_frames += 1
+		else:
+			self.sparse_frames += 1
+		self.misses = 0 if found else self.misses + 1
+		self.stride = self.dense_stride if self.misses < self.patience else self.sparse_stride
+
+	"""
+	Whether the sampler is sparse, i.e. the next frame is sampled with the sparse stride
+	
+	Inputs:(Zero)
+	Outputs:(One)
+		1. sparse: true iff the stride is the sparse stride
+		type: boolean
+	"""
+	def is_sparse(self):
+		return self.stride != self.dense_stride
+
+	"""
+	Amount of sampled frames the sampler was told about
+	
+	Inputs:(Zero)
+	Outputs:(One)
+		1. frames: amount of calls to update
+		type: int
+	"""
+	def updates(self):
+		return self.dense_frames + self.sparse_frames
+
+
+class FrameGate:
+	def __init__(self, threshold, thumbnail_width=64):
+		self.threshold = threshold
+		self.thumbnail_width = thumbnail_width
+		# thumbnail of the last frame that was let through
+		self.reference = None
+		self.processed = 0
+		self.skipped = 0
+
+	def __str__(self):
+		return "FrameGate(processed frames: " + str(self.processed) + ", skipped frames: " + str(self.skipped) + ")"
+
+	"""
+	Check whether a frame is static, i.e. the mean absolute difference between its thumbnail and the thumbnail
+	of the last frame that was not static is below the threshold (in grey levels).
+	
+	Inputs:(One)
+		1. image: the frame to check
+		type: 3D array
+	Outputs:(One)
+		1. static: true iff the frame barely differs from the last frame that was not static
+		type: boolean
+	"""
+	def is_static(self, image):
+		height = max(1, round(len(image) * self.thumbnail_width / len(image[0])))
+		thumbnail = cv2.resize(image, (self.thumbnail_width, height), interpolation=cv2.INTER_AREA)
+		if self.reference is not None and cv2.norm(thumbnail, self.reference, cv2.NORM_L1) / thumbnail.size < self.threshold:
+			self.skipped += 1
+			return True
+		self.reference = thumbnail
+		self.processed += 1
+		return False
+
+
+class PlateTracker:
+	def __init__(self, full_scan_interval, padding=0.5, min_padding=32):
+		self.full_scan_interval = full_scan_interval
+		self.padding = padding
+		self.min_padding = min_padding
+		# bounding boxes of the plates found in the last localized frame
+		self.boxes = []
+		self.since_full_scan = 0
+		self.full_scans = 0
+		self.region_scans = 0
+
+	def __str__(self):
+		return "PlateTracker(full scans: " + str(self.full_scans) + ", region scans: " + str(self.region_scans) + ")"
+
+	"""
+	Get the regions to search for plates in the next frame: the bounding boxes of the last frame,
+	padded and clipped to the image, with overlapping regions merged.
+	
+	Inputs:(Two)
+		1. height: height of the image
+		type: int
+		2. width: width of the image
+		type: int
+	Outputs:(One)
+		1. regions: regions to search in, None if the whole image should be searched
+		type: list(BoundingBox) or None
+	"""
+	def regions(self, height, width):
+		if len(self.boxes) == 0 or self.since_full_scan >= self.full_scan_interval:
+			return None
+		regions = []
+		for box in self.boxes:
+			pad_rows = max(self.min_padding, int((box.max_x - box.min_x) * self.padding))
+			pad_cols = max(self.min_padding, int((box.max_y - box.min_y) * self.padding))
+			regions.append(BoundingBox(max(0, box.min_x - pad_rows), min(height, box.max_x + pad_rows),
+									   max(0, box.min_y - pad_cols), min(width, box.max_y + pad_cols)))
+		return merge_overlapping(regions)
+
+	"""
+	Remember the plates found in a frame
+	
+	Inputs:(Two)
+		1. plates: plates found in the frame
+		type: list of pairs of image and BoundingBox
+		2. full_scan: whether the whole frame was searched
+		type: boolean
+	Outputs:(Zero)
+	"""
+	def update(self, plates, full_scan):
+		self.boxes = [bb for _, bb in plates]
+		if full_scan:
+			self.full_scans += 1
+			self.since_full_scan = 0
+		else:
+			self.region_scans += 1
+			self.since_full_scan += 1
+
+
+class TemplateBank:
+	def __init__(self, templates):
+		self.labels = [label for label, _ in templates]
+		self.templates = [template for _, template in templates]
+
+	"""
+	Get all templates resized to the given size and stacked in the order of the labels.
+	Characters come in so many sizes that the stacks are not cached: on training_vid_cat3, 1345 characters
+	had 679 different sizes and a cache of 64 MB served only 5% of the lookups.
+	
+	Inputs:(Two)
+		1. width: width to resize the templates to
+		type: int
+		2. height: height to resize the templates to
+		type: int
+	Outputs:(One)
+		1. resized: the resized templates
+		type: 3D array of shape (templates, height, width)
+	"""
+	def resized(self, width, height):
+		return self.resized_subset(width, height, range(len(self.templates)))
+
+	"""
+	Get some of the templates resized to the given size and stacked in the order of the indices.
+	
+	Inputs:(Three)
+		1. width: width to resize the templates to
+		type: int
+		2. height: height to resize the templates to
+		type: int
+		3. indices: indices of the templates in the order of the labels
+		type: 1D array of ints
+	Outputs:(One)
+		1. resized: the resized templates
+		type: 3D array of shape (indices, height, width)
+	"""
+	def resized_subset(self, width, height, indices):
+		resized = np.empty((len(indices), height, width), np.uint8)
+		for i, stacked in zip(indices, resized):
+			cv2.resize(self.templates[i], (width, height), dst=stacked)
+		return resized
+
+
+class RecognitionCascade:
+	def __init__(self, strategies):
+		self.strategies = strategies
+		self.lock = threading.Lock()
+		self.reset()
+
+	def __str__(self):
+		return "RecognitionCascade(" + ", ".join(
+			str(strategy) + ": " + str(self.successes[i]) + "/" + str(self.attempts[i]) + " valid in "
+			+ f"{self.seconds[i]:0.3f}" + " seconds" for i, strategy in enumerate(self.strategies)) + ")"
+
+	"""
+	Get the order to try the strategies in
+	
+	Inputs:(One)
+		1. reorder: whether to order the strategies by their observed success rate,
+		otherwise they are tried in the order they were given in
+		type: boolean
+	Outputs:(One)
+		1. order: indices of the strategies
+		type: list(int)
+	"""
+	def order(self, reorder):
+		if not reorder:
+			return list(range(len(self.strategies)))
+		with self.lock:
+			# start every strategy at a success rate of one half, ties keep the given order
+			rates = [(self.successes[i] + 1) / (self.attempts[i] + 2) for i in range(len(self.strategies))]
+		return sorted(range(len(self.strategies)), key=lambda i: -rates[i])
+
+	"""
+	Remember the outcome of trying a strategy
+	
+	Inputs:(Three)
+		1. index: index of the strategy
+		type: int
+		2. success: whether the strategy gave a valid plate
+		type: boolean
+		3. seconds: time the strategy took
+		type: float
+	Outputs:(Zero)
+	"""
+	def record(self, index, success, seconds):
+		with self.lock:
+			self.attempts[index] += 1
+			self.successes[index] += int(success)
+			self.seconds[index] += seconds
+
+	"""
+	Forget the outcomes of all strategies, so a new run is not ordered by the runs before it
+	
+	Inputs:(Zero)
+	Outputs:(Zero)
+	"""
+	def reset(self):
+		with self.lock:
+			self.attempts = [0] * len(self.strategies)
+			self.successes = [0] * len(self.strategies)
+			self.seconds = [0.0] * len(self.strategies)
+
+
+class RecognitionCache:
+	def __init__(self, max_entries=256):
+		self.max_entries = max_entries
+		# recognized plate per plate hash, least recently used first
+		self.cache = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __str__(self):
+		return "RecognitionCache(hits: " + str(self.hits) + ", misses: " + str(self.misses) + ", hit rate: " \
+			+ f"{self.hit_rate() * 100:0.1f}" + "%, entries: " + str(len(self.cache)) \
+			+ ", evictions: " + str(self.evictions) + ")"
+
+	"""
+	Fraction of the lookups that were served from the cache
+	
+	Inputs:(Zero)
+	Outputs:(One)
+		1. hit_rate: hits divided by lookups, 0 before the first lookup
+		type: float
+	"""
+	def hit_rate(self):
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups > 0 else 0
+
+	"""
+	Look up the plate recognized for a plate hash. Without an entry for the hash itself, the closest hash that
+	differs in at most tolerance bits is used.
+	
+	Inputs:(Two)
+		1. key: hash of the plate image
+		type: int
+		2. tolerance: number of bits a cached hash may differ in
+		type: int
+	Outputs:(Two)
+		1. found: whether a cached hash was close enough
+		type: boolean
+		2. recognized: the cached recognized plate (None if none was recognized), None if not found
+		type: string
+	"""
+	def get(self, key, tolerance):
+		with self.lock:
+			if key not in self.cache and tolerance > 0:
+				distances = [(hamming_distance(key, other), other) for other in self.cache]
+				distance, closest = min(distances, default=(tolerance + 1, None))
+				if distance <= tolerance:
+					key = closest
+			if key not in self.cache:
+				self.misses += 1
+				return False, None
+			self.cache.move_to_end(key)
+			self.hits += 1
+			return True, self.cache[key]
+
+	"""
+	Remember the plate recognized for a plate hash, evicting the least recently used hash once there are more
+	than max_entries
+	
+	Inputs:(Two)
+		1. key: hash of the plate image
+		type: int
+		2. recognized: the recognized plate, None if none was recognized
+		type: string
+	Outputs:(Zero)
+	"""
+	def put(self, key, recognized):
+		with self.lock:
+			self.cache[key] = recognized
+			self.cache.move_to_end(key)
+			while len(self.cache) > self.max_entries:
+				self.cache.popitem(last=False)
+				self.evictions += 1
+
+	"""
+	Forget all cached plates, keeping the counters
+	
+	Inputs:(Zero)
+	Outputs:(Zero)
+	"""
+	def clear(self):
+		with self.lock:
+			self.cache.clear()
+
+
+class ScratchPool:
+	def __init__(self, max_buffers=8):
+		self.max_buffers = max_buffers
+		# buffers per thread, so threads never share one
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def __str__(self):
+		return "ScratchPool(hits: " + str(self.hits) + ", misses: " + str(self.misses) + ")"
+
+	"""
+	Get a scratch buffer of some shape and type, as a view of the start of the buffer of the last call with the same
+	name and type on this thread, so images of different sizes reuse it. The buffer is only grown when it is too small.
+	Its contents are undefined and it is only valid until the next call with the same name and type.
+	
+	Inputs:(Three)
+		1. name: what the buffer is used for, so buffers used at the same time are not the same
+		type: string
+		2. shape: shape of the buffer
+		type: tuple of ints
+		3. dtype: type of the buffer
+		type: numpy dtype
+	Outputs:(One)
+		1. buffer: the scratch buffer
+		type: array
+	"""
+	def get(self, name, shape, dtype):
+		buffers = getattr(self.local, "buffers", None)
+		if buffers is None:
+			buffers = self.local.buffers = OrderedDict()
+		key = (name, np.dtype(dtype))
+		size = math.prod(shape)
+		buffer = buffers.get(key)
+		if buffer is not None and buffer.size >= size:
+			buffers.move_to_end(key)
+			with self.lock:
+				self.hits += 1
+		else:
+			with self.lock:
+				self.misses += 1
+			buffer = buffers[key] = np.empty(size, dtype)
+			buffers.move_to_end(key)
+			if len(buffers) > self.max_buffers:
+				buffers.popitem(last=False)
+		return buffer[:size].reshape(shape)
+
+
+"""
+Check whether two bounding boxes overlap
+
+Inputs:(Two)
+	1. bb1: first bounding box
+	type: BoundingBox
+	2. bb2: second bounding box
+	type: BoundingBox
+Outputs:(One)
+	1. overlap: true iff the bounding boxes overlap
+	type: boolean
+"""
+def overlapping(bb1, bb2):
+	return bb1.min_x < bb2.max_x and bb2.min_x < bb1.max_x and bb1.min_y < bb2.max_y and bb2.min_y < bb1.max_y
+
+
+"""
+Merge overlapping bounding boxes into the bounding box around them, until none overlap
+
+Inputs:(One)
+	1. boxes: bounding boxes to merge
+	type: list(BoundingBox)
+Outputs:(One)
+	1. merged: bounding boxes that do not overlap
+	type: list(BoundingBox)
+"""
+def merge_overlapping(boxes):
+	merged = []
+	for box in boxes:
+		others = [other for other in merged if overlapping(box, other)]
+		while len(others) > 0:
+			for other in others:
+				merged.remove(other)
+				box = BoundingBox(min(box.min_x, other.min_x), max(box.max_x, other.max_x),
+								  min(box.min_y, other.min_y), max(box.max_y, other.max_y))
+			others = [other for other in merged if overlapping(box, other)]
+		merged.append(box)
+	return merged
+
+
+"""
+Count the bits two hashes differ in
+
+Inputs:(Two)
+	1. hash1: first hash
+	type: int
+	2. hash2: second hash
+	type: int
+Outputs:(One)
+	1. distance: hamming distance between the hashes
+	type: int
+"""
+def hamming_distance(hash1, hash2):
+	return bin(hash1 ^ hash2).count('1')
@@ -2,6 +2,34 @@ import cv2
 import numpy as np
 
 
+# rotations smaller than this (in degrees) are not worth warping the plate for
+MIN_ROTATION = 1.5
+# rotations are capped at this many degrees
+MAX_ROTATION = 16
+
+
+"""
+Correct plate rotation with the estimator selected in the options
+
+Inputs:(Three)
+	1. img: image to be corrected
+	type: 2D array
+	2. mask: mask of the image
+	type: 2D array
+	3. options: localization options, None for the defaults
+	type: Options
+Outputs:(Two)
+	1. rotated: rotated and corrected image
+	type: 2D array
+	2. rotated_mask: rotated and corrected mask
+	type: 2D array
+"""
+def correct_plate(img, mask, options = None):
+	if options is not None and options.deskew == 'moments':
+		return correct_plate_moments(img, mask)
+	return correct_plate_hough(img, mask)
+
+
 """
 Correct plate rotation using the hough transform
 
@@ -23,16 +51,65 @@ def correct_plate_hough(img, mask):
 		angle = (lines[0][0][1] + lines[1][0][1])/2
 		rotation_angle = (np.pi / 2 - angle) * 180 / np.pi
 
-	if not (-1.5 < rotation_angle < 1.5):
-		rotation_angle = min(16, rotation_angle)
-		M = cv2.getRotationMatrix2D((len(img[0]) / 2, len(img) / 2), -rotation_angle, 1)
+	if not (-MIN_ROTATION < rotation_angle < MIN_ROTATION):
+		rotation_angle = min(MAX_ROTATION, rotation_angle)
+		return rotate_plate(img, mask, -rotation_angle)
+	return img, mask
+
 
-		rotated = cv2.warpAffine(img, M, (len(img[0]), len(img)))
-		rotated_mask = cv2.warpAffine(mask, M, (len(mask[0]), len(mask)))
-		return post_rotation_crop(rotated, rotated_mask)
+"""
+Correct plate rotation using the orientation of the mask, taken from its second order central moments.
+This needs a single pass over the mask instead of an edge image and a hough accumulator.
+
+Inputs:(Two)
+	1. img: image to be corrected
+	type: 2D array
+	2. mask: mask of the image
+	type: 2D array
+Outputs:(Two)
+	1. rotated: rotated and corrected image
+	type: 2D array
+	2. rotated_mask: rotated and corrected mask
+	type: 2D array
+"""
+def correct_plate_moments(img, mask):
+	moments = cv2.moments(mask, True)
+	if moments['m00'] == 0:
+		return img, mask
+
+	# angle of the major axis of the mask, positive when the plate goes down to the right
+	angle = 0.5 * np.arctan2(2 * moments['mu11'], moments['mu20'] - moments['mu02']) * 180 / np.pi
+
+	if not (-MIN_ROTATION < angle < MIN_ROTATION):
+		angle = max(-MAX_ROTATION, min(MAX_ROTATION, angle))
+		return rotate_plate(img, mask, angle)
 	return img, mask
 
 
+"""
+Rotate an image and its mask around their centre and crop them to the plate
+
+Inputs:(Three)
+	1. img: image to rotate
+	type: np array
+	2. mask: mask of the image
+	type: 2D array
+	3. angle: counter-clockwise rotation in degrees
+	type: float
+Outputs:(Two)
+	1. cropped_image: rotated image after cropping
+	type: np array
+	2. cropped_mask: rotated mask after cropping
+	type: 2D array
+"""
+def rotate_plate(img, mask, angle):
+	M = cv2.getRotationMatrix2D((len(img[0]) / 2, len(img) / 2), angle, 1)
+
+	rotated = cv2.warpAffine(img, M, (len(img[0]), len(img)))
+	rotated_mask = cv2.warpAffine(mask, M, (len(mask[0]), len(mask)))
+	return post_rotation_crop(rotated, rotated_mask)
+
+
 """
 Detect edges using Canny
 
@@ -1,9 +1,13 @@
 import cv2
 import numpy as np
+from Classes import ScratchPool
 
 
 EPSILON = 0.001
 
+# intermediate images, reused between plates
+scratch = ScratchPool()
+
 
 """
 Clamp grayscale colours between 0 and 255
@@ -31,73 +35,94 @@ Outputs:(One)
     type: int
 """
 def isodata_threshold(image):
-    hist = np.bincount(np.floor(image.flatten()).astype(np.uint8), minlength=256)
+    if image.dtype == np.uint8:
+        hist = np.bincount(image.ravel(), minlength=256)
+    else:
+        hist = np.bincount(np.floor(image.flatten()).astype(np.uint8), minlength=256)
+    return isodata_threshold_histogram(hist)
+
+
+"""
+Calculate global isodata threshold given the histogram of a grayscale image.
+For every candidate threshold i the means below and above i come from cumulative sums
+of the histogram and of g * hist[g], instead of summing them again for every i.
+
+Inputs:(One)
+    1. hist: number of pixels of each grey level
+    type: 1D array of 256 ints
+Outputs:(One)
+    1. threshold: calculated isodata threshold (between 0 and 255)
+    type: int
+"""
+def isodata_threshold_histogram(hist):
+    hist = np.asarray(hist, dtype=np.int64)
     nonzero = np.where(hist != 0)[0]
     gmin = nonzero[0]
     gmax = nonzero[::-1][0]
-    # mapping i to ti
-    t = {0: np.average([gmin, gmax])}
-    min_diff = np.inf
-    min_i = 0
-    for i in range(0, 255):
-        # calculate m1
-        numerator = 0
-        for g in range(gmin, i + 1):
-            numerator += g * hist[g]
-        denominator = np.sum(hist[gmin:i+1]) + 0.000001
-        m1 = numerator/denominator
-        # calculate m2
-        numerator = 0
-        for g in range(i, gmax + 1):
-            numerator += g * hist[g]
-        denominator = np.sum(hist[i:gmax+1]) + 0.000001
-        m2 = numerator/denominator
-
-        t[i + 1] = np.average([m1, m2])
-        curr_diff = np.abs(t[i + 1] - t[i])
-        if curr_diff < min_diff:
-            min_diff = curr_diff
-            min_i = i
-        if curr_diff <= EPSILON:
-            return np.floor(t[i])
-    return np.floor(t[min_i])
-
-
-"""
-Apply contrast stretching to some image
+    levels = np.arange(256, dtype=np.int64)
+    # sums of hist[g] and g * hist[g] over the grey levels up to and including i
+    count_below = np.cumsum(hist)
+    moment_below = np.cumsum(levels * hist)
+    # and over the grey levels from i up, for i in 0 to 254
+    count_above = count_below[-1] - np.concatenate([[0], count_below[:254]])
+    moment_above = moment_below[-1] - np.concatenate([[0], moment_below[:254]])
+    m1 = moment_below[:255] / (count_below[:255] + 0.000001)
+    m2 = moment_above / (count_above + 0.000001)
+    # t[i] for i in 0 to 255
+    t = np.concatenate([[(gmin + gmax) / 2], (m1 + m2) / 2])
+    diff = np.abs(t[1:] - t[:-1])
+    converged = np.where(diff <= EPSILON)[0]
+    if len(converged) > 0:
+        return np.floor(t[converged[0]])
+    return np.floor(t[np.argmin(diff)])
+
+
+"""
+Apply contrast stretching to some image.
+The stretching is computed in float, exactly like before, so the results stay the same bit for bit.
+A lookup table of the stretched grey levels is not faster: cv2.LUT alone takes as long on a plate.
 
-Inputs:(Three)
+Inputs:(Four)
     1. img: the image to perform contrast stretching on
     type: image as numpy array (grayscale)
     2. alpha: alpha for contrast stretching
     type: float
     3. beta: the beta to use for contrast stretching
     type: float
+    4. out: array to write the result to, a new one if None
+    type: 2D array of uint8 or None
 Outputs:(One)
     1. stretched: image with contrast stretching applied to it
         type: image as numpy array (grayscale)
 """
-def contrast_stretching(img, alpha = 0, beta=1):
-    copy = img
-    return (255 * cv2.normalize(copy, None, alpha=alpha, beta=beta, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)).astype(np.uint8)
+def contrast_stretching(img, alpha = 0, beta=1, out=None):
+    if out is None:
+        out = np.empty(img.shape, np.uint8)
+    stretched = scratch.get('stretched', img.shape, np.float32)
+    cv2.normalize(img, stretched, alpha=alpha, beta=beta, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+    np.multiply(stretched, np.float32(255), out=stretched)
+    # truncate like astype
+    np.copyto(out, stretched, casting='unsafe')
+    return out
 
 
 """
 Given a binarized image, invert the colours
 
-Inputs:(One)
+Inputs:(Two)
     image: binarized image to invert
     type: array (2D)
+    out: array to write the result to, the image itself if None
+    type: array (2D) or None
 Outputs:(One)
     inverted: inverted binary image
     type: array (2D)
 """
-def invert_colours(image):
-    inverted = image
-    for i in range(0, len(image)):
-        for j in range(0, len(image[i])):
-            inverted[i,j] = 0 if inverted[i,j] == 255 else 255
-    return inverted
+def invert_colours(image, out=None):
+    if out is None:
+        out = image
+    # every pixel that is not white becomes white
+    return cv2.compare(image, 255, cv2.CMP_NE, dst=out)
 
 
 """
@@ -106,7 +131,7 @@ the image black, by inverting the image if the background is white
 this assumes that the background is the dominant colour in the image
 
 Inputs:(One)
-    1. image: binarized image to perform the operation on
+    1. image: binarized image to perform the operation on, inverted in place if needed
     type: array (2D)
 Outputs:(One)
     1. white_chars_plate: image where characters should be white
@@ -114,7 +139,7 @@ Outputs:(One)
 """
 def white_chars(image):
     white_chars_plate = image
-    dominant_colour = 255 if np.count_nonzero(image) >= len(image)/2 else 0
+    dominant_colour = 255 if cv2.countNonZero(image) >= len(image)/2 else 0
     # invert image if white is the dominant colour
     if dominant_colour == 255:
         white_chars_plate = invert_colours(white_chars_plate)
@@ -123,39 +148,58 @@ def white_chars(image):
 
 """
 Binarize an image
+
+Inputs:(Three)
+    1. img: grayscale image to binarize
+    type: 2D array of uint8
+    2. enhance_technique: 1 for contrast stretching, 2 for histogram equalization
+    type: int
+    3. out: array to write the result to, a new one if None
+    type: 2D array of uint8 or None
+Outputs:(One)
+    1. binarized: binary image with white characters
+    type: 2D array of uint8
 """
-def binarize(img, enhance_technique = 1):
+def binarize(img, enhance_technique = 1, out=None):
     enhanced_image = img
     if enhance_technique == 1:  # contrast stretching for dark images
-        enhanced_image = contrast_stretching(enhanced_image, 0, 1)
+        enhanced_image = contrast_stretching(enhanced_image, 0, 1, scratch.get('enhanced', img.shape, np.uint8))
     if enhance_technique == 2:  # histogram equalization
-        enhanced_image = cv2.equalizeHist(enhanced_image)
-    enhanced_image = cv2.GaussianBlur(enhanced_image, (5, 5), 0)
-    threshold = isodata_threshold(enhanced_image)
-    _, binarized = cv2.threshold(enhanced_image, threshold, 255, cv2.THRESH_BINARY)
+        enhanced_image = cv2.equalizeHist(enhanced_image, scratch.get('enhanced', img.shape, np.uint8))
+    blurred = cv2.GaussianBlur(enhanced_image, (5, 5), 0, dst=scratch.get('blurred', img.shape, np.uint8))
+    threshold = isodata_threshold(blurred)
+    if out is None:
+        out = np.empty(img.shape, np.uint8)
+    cv2.threshold(blurred, threshold, 255, cv2.THRESH_BINARY, dst=out)
     # make sure characters are white
-    return white_chars(binarized)
+    return white_chars(out)
 
 
 """
 Binarize an image
-"""
-def binarize_adaptive(img, enhance_technique = 1):
-    enhanced_image = img
-    if enhance_technique == 1:  # contrast stretching for dark images
-        enhanced_image = contrast_stretching(enhanced_image, 0.2, 0.02)
-    if enhance_technique == 2:  # histogram equalization
-        enhanced_image = cv2.equalizeHist(enhanced_image)
-    #enhanced_image = cv2.GaussianBlur(enhanced_image, (5, 5), 0)
-    binarized = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 51, 5)
+
+Inputs:(Two)
+    1. img: grayscale image to binarize
+    type: 2D array of uint8
+    2. out: array to write the result to, a new one if None
+    type: 2D array of uint8 or None
+Outputs:(One)
+    1. binarized: binary image with white characters
+    type: 2D array of uint8
+"""
+def binarize_adaptive(img, out=None):
+    # the adaptive threshold is taken of the image itself, without contrast stretching or histogram equalization
+    if out is None:
+        out = np.empty(img.shape, np.uint8)
+    cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 51, 5, dst=out)
     # make sure characters are white
-    return white_chars(binarized)
+    return white_chars(out)
 
 
 """
 Sharpen an unsharp mask
 
-Inputs:(Four)
+Inputs:(Five)
     1. image: image to sharpen
     type: np array 2D
     2. kernel_size: size of gaussian kernel
@@ -164,14 +208,15 @@ Inputs:(Four)
     type: float
     4. sharp_factor: multiplication factor for sharpening
     type: float
+    5. out: array to write the result to, a new one if None
+    type: array of uint8 (same shape as image) or None
 Outputs:(One)
     1. sharpened: sharpened image
     type: np array 2D
 """
-def unsharp_mask(image, kernel_size=(5, 5), sigma=1, sharp_factor=2.0):
-    blurred = cv2.GaussianBlur(image, kernel_size, sigma)
-    sharpened = float(sharp_factor + 1) * image - float(sharp_factor) * blurred
-    sharpened = np.maximum(sharpened, np.zeros(sharpened.shape))
-    sharpened = np.minimum(sharpened, 255 * np.ones(sharpened.shape))
-    sharpened = sharpened.round().astype(np.uint8)
-    return sharpened
+def unsharp_mask(image, kernel_size=(5, 5), sigma=1, sharp_factor=2.0, out=None):
+    blurred = cv2.GaussianBlur(image, kernel_size, sigma, dst=scratch.get('blurred', image.shape, image.dtype))
+    if out is None:
+        out = np.empty(image.shape, np.uint8)
+    # (1 + sharp_factor) * image - sharp_factor * blurred, rounded and clamped to 0 - 255
+    return cv2.addWeighted(image, float(sharp_factor + 1), blurred, -float(sharp_factor), 0, dst=out)
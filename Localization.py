@@ -1,8 +1,8 @@
 import cv2
 import LocalizationUtils
 from Morphology import denoise
-from Correction import correct_plate_hough
-from Classes import BoundingBox
+from Correction import correct_plate
+from Classes import BoundingBox, merge_overlapping
 
 
 """
@@ -11,46 +11,134 @@ To do:
 	1. Localize the plates and crop the plates
 	2. Adjust the cropped plate images
 	
-Inputs:(One)
+Inputs:(Two)
 	1. image: captured frame in CaptureFrame_Process.CaptureFrame_Process function
 	type: Numpy array (imread by OpenCV package)
+	2. options: localization options (e.g. coarse-to-fine scale), None for the defaults
+	type: Options
 Outputs:(One)
-	1. plate_imgs: cropped and adjusted plate images
-	type: list, each element in 'plate_imgs' is the cropped image(Numpy array)
+	1. plate_imgs: cropped and adjusted plate images and their bounding boxes
+	type: list, each element in 'plate_imgs' is a pair of the cropped image(Numpy array) and its BoundingBox
 """
-def plate_detection(image):
-	# creating mask
-	color_min, color_max = LocalizationUtils.yellow_range()
-	mask = LocalizationUtils.create_mask(image, color_min, color_max)
+def plate_detection(image, options = None):
+	if options is not None and options.localization_scale > 1:
+		return plate_detection_coarse(image, options.localization_scale, options)
+	return find_plates(image, options)
 
-	# denoise mask
-	# defined in Morphology.py
-	denoised_mask = denoise(mask)
 
-	# filter out components in mask that are likely to be noise
-	# append the bounding boxes of potential license plates to a list
-	potential_plate_bbs = []
-	stats = cv2.connectedComponentsWithStats(denoised_mask, 4)[2]
-	for stat in stats:
-		width = stat[2]
-		height = stat[3]
-		area = stat[4]
-
-		if LocalizationUtils.is_not_license_plate_prelim(width, height, area):
-			continue
-		bounding_box = BoundingBox(stat[1], stat[1] + stat[3], stat[0], stat[0] + stat[2])
-		potential_plate_bbs.append(bounding_box)
+"""
+Localize and crop the plates in an image, working on the image at full resolution
 
+Inputs:(Two)
+	1. image: image to localize the plates in
+	type: Numpy array (imread by OpenCV package)
+	2. options: localization options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. plate_imgs: cropped and adjusted plate images and their bounding boxes
+	type: list of pairs of image and BoundingBox
+"""
+def find_plates(image, options = None):
 	# for each potential plate, run some more restricting checks
 	# append a rotation corrected version of the plate to a list
 	plates = []
-	for potential_plate_bb in potential_plate_bbs:
-		cropped_image = LocalizationUtils.crop_image(potential_plate_bb, image)
-		cropped_mask = LocalizationUtils.crop_image(potential_plate_bb, denoised_mask)
-		corrected_image, corrected_mask = correct_plate_hough(cropped_image, cropped_mask)
+	for cropped_image, cropped_mask, potential_plate_bb in candidate_crops(image, options):
+		corrected_image, corrected_mask = correct_plate(cropped_image, cropped_mask, options)
 		refitted_image, refitted_mask = LocalizationUtils.refit_image(corrected_image, corrected_mask)
 		if LocalizationUtils.is_not_license_plate(refitted_mask):
 			continue
 		plates.append((refitted_image, potential_plate_bb))
 
 	return plates
+
+
+"""
+Crop the image and the denoised mask to each component of the mask that could be a plate,
+before any rotation correction or further checks
+
+Inputs:(Two)
+	1. image: image to find the candidates in
+	type: Numpy array (imread by OpenCV package)
+	2. options: localization options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. candidates: cropped image, cropped mask and bounding box of each candidate
+	type: list of triples of image, mask and BoundingBox
+"""
+def candidate_crops(image, options = None):
+	# creating mask
+	mask = LocalizationUtils.yellow_mask(image)
+
+	# denoise mask
+	# defined in Morphology.py
+	denoised_mask = denoise(mask, 1, options)
+
+	# filter out components in mask that are likely to be noise
+	candidates = []
+	stats = cv2.connectedComponentsWithStats(denoised_mask, 4)[2]
+	for stat in LocalizationUtils.plate_candidates(stats):
+		bounding_box = BoundingBox(stat[1], stat[1] + stat[3], stat[0], stat[0] + stat[2])
+		cropped_image = LocalizationUtils.crop_image(bounding_box, image)
+		cropped_mask = LocalizationUtils.crop_image(bounding_box, denoised_mask)
+		candidates.append((cropped_image, cropped_mask, bounding_box))
+	return candidates
+
+
+"""
+Localize plates only inside the given regions of the image, e.g. around the plates found in the previous frame.
+The bounding boxes of the plates are relative to the whole image.
+
+Inputs:(Three)
+	1. image: captured frame in CaptureFrame_Process.CaptureFrame_Process function
+	type: Numpy array (imread by OpenCV package)
+	2. regions: regions of the image to search in
+	type: list(BoundingBox)
+	3. options: localization options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. plate_imgs: cropped and adjusted plate images and their bounding boxes
+	type: list of pairs of image and BoundingBox
+"""
+def plate_detection_in_regions(image, regions, options = None):
+	plates = []
+	for region in regions:
+		region_image = LocalizationUtils.crop_image(region, image)
+		for plate, bb in find_plates(region_image, options):
+			# move the bounding box from region coordinates to image coordinates
+			bounding_box = BoundingBox(bb.min_x + region.min_x, bb.max_x + region.min_x, bb.min_y + region.min_y, bb.max_y + region.min_y)
+			plates.append((plate, bounding_box))
+	return plates
+
+
+"""
+Coarse-to-fine localization: find candidate plates on a downscaled copy of the image,
+then localize the plates at full resolution only inside the (upscaled and padded) candidate boxes.
+
+Inputs:(Three)
+	1. image: captured frame in CaptureFrame_Process.CaptureFrame_Process function
+	type: Numpy array (imread by OpenCV package)
+	2. scale: factor to downscale the image by for finding candidates, e.g. 2 or 4
+	type: int
+	3. options: localization options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. plate_imgs: cropped and adjusted plate images and their bounding boxes
+	type: list of pairs of image and BoundingBox
+"""
+def plate_detection_coarse(image, scale, options = None):
+	height, width = len(image), len(image[0])
+	small = cv2.resize(image, (width // scale, height // scale), interpolation=cv2.INTER_AREA)
+
+	# creating and denoising the mask of the downscaled image
+	mask = LocalizationUtils.yellow_mask(small)
+	denoised_mask = denoise(mask, scale, options)
+
+	# upscale the bounding boxes of the candidates, padded so the full resolution morphology fits
+	regions = []
+	stats = cv2.connectedComponentsWithStats(denoised_mask, 4)[2]
+	for stat in LocalizationUtils.plate_candidates(stats, scale):
+		padding = LocalizationUtils.COARSE_PADDING
+		regions.append(BoundingBox(max(0, stat[1] * scale - padding), min(height, (stat[1] + stat[3]) * scale + padding),
+								   max(0, stat[0] * scale - padding), min(width, (stat[0] + stat[2]) * scale + padding)))
+
+	return plate_detection_in_regions(image, merge_overlapping(regions), options)
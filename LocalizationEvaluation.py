@@ -148,20 +148,24 @@ Evaluate localization for a specific category (1-4)
 The evaluation score for the specific category will be printed for the training set
 Make sure that the files for both exist and are properly named.
 
-Inputs:(One)
+Inputs:(Three)
     1. cat: category to report evaluation for
     type: int (1-4)
-Outputs:(Zero)
+    2. sample_freq: how often a frame should be taken
+    type: int
+    3. options: localization options, None for the defaults
+    type: Options
+Outputs:(One)
+    1. score: percentage of correctly localized plates, None if the video or labels are missing
+    type: float
 """
-def evaluate_category_training(cat, sample_freq):
+def evaluate_category_training(cat, sample_freq, options=None):
     global image_size
     # loading training video
     vid_path = "training/training_vid_cat" + str(cat) + ".mp4"
     if not os.path.exists(vid_path):
         print("Training video for category " + str(cat) + " not found, skipping this category")
         return
-    frame_map, _ = CaptureFrame_Process.loadFrames(vid_path, sample_freq)
-    image_size = frame_map[0].shape[0] * frame_map[0].shape[1]
     # loading training labels
     label_path = "training/training_labels_cat" + str(cat) + ".json"
     if not os.path.exists(label_path):
@@ -170,15 +174,17 @@ def evaluate_category_training(cat, sample_freq):
     training_labels = read_bounding_box_labels(label_path)
     # get bounding boxes for training set
     training_bbs = {}
-    for frame_nr, frame in frame_map.items():
-        localized_list = Localization.plate_detection(frame)
+    for frame_nr, _, frame in CaptureFrame_Process.frame_source(vid_path, sample_freq):
+        image_size = frame.shape[0] * frame.shape[1]
+        localized_list = Localization.plate_detection(frame, options)
         bbs = []
         for _, bb in localized_list:
             bbs.append(bb)
         training_bbs[frame_nr] = bbs
     # get evaluation score
-    score = evaluate_localization(training_bbs, training_labels, frame_map)
+    score = evaluate_localization(training_bbs, training_labels, training_bbs)
     print("Training category " + str(cat) + ": " + str(score) + "%")
+    return score
 
 
 """
@@ -186,20 +192,24 @@ Evaluate localization for a specific category (1-4)
 The evaluation score for the specific category will be printed for the validation set
 Make sure that the files for both exist and are properly named.
 
-Inputs:(One)
+Inputs:(Three)
     1. cat: category to report evaluation for
     type: int (1-4)
-Outputs:(Zero)
+    2. sample_freq: how often a frame should be taken
+    type: int
+    3. options: localization options, None for the defaults
+    type: Options
+Outputs:(One)
+    1. score: percentage of correctly localized plates, None if the video or labels are missing
+    type: float
 """
-def evaluate_category_validation(cat, sample_freq):
+def evaluate_category_validation(cat, sample_freq, options=None):
     global image_size
     # loading validation video
     vid_path = "validation/tst_vid_cat" + str(cat) + ".mp4"
     if not os.path.exists(vid_path):
         print("Validation video for category " + str(cat) + " not found, skipping this category")
         return
-    frame_map, _ = CaptureFrame_Process.loadFrames(vid_path, sample_freq)
-    image_size = frame_map[0].shape[0] * frame_map[0].shape[1]
     # loading validation labels
     label_path = "validation/tst_labels_cat" + str(cat) + ".json"
     if not os.path.exists(label_path):
@@ -208,12 +218,14 @@ def evaluate_category_validation(cat, sample_freq):
     testing_labels = read_bounding_box_labels(label_path)
     # get bounding boxes for training set
     testing_bbs = {}
-    for frame_nr, frame in frame_map.items():
-        localized_list = Localization.plate_detection(frame)
+    for frame_nr, _, frame in CaptureFrame_Process.frame_source(vid_path, sample_freq):
+        image_size = frame.shape[0] * frame.shape[1]
+        localized_list = Localization.plate_detection(frame, options)
         bbs = []
         for _, bb in localized_list:
             bbs.append(bb)
         testing_bbs[frame_nr] = bbs
     # get evaluation score
-    score = evaluate_localization(testing_bbs, testing_labels, frame_map)
+    score = evaluate_localization(testing_bbs, testing_labels, testing_bbs)
     print("Validation category " + str(cat) + ": " + str(score) + "%")
+    return score
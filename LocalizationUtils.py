@@ -11,6 +11,9 @@ MIN_WIDTH = 50
 MAX_HEIGHT = 200
 MIN_HEIGHT = 30
 MIN_FILL = 0.85
+# padding in pixels around upscaled coarse candidates, enough for the full resolution morphology
+COARSE_PADDING = 32
+
 
 
 """
@@ -56,6 +59,22 @@ def create_mask(image, minV, maxV):
 	return mask
 
 
+"""
+Create the mask of the yellow (license plate) colours in an image
+
+Inputs:(One)
+	1. image: rgb image
+	type: array (3D)
+
+Outputs:(One)
+	1. mask: image with values either 0 or 255, same size as input image
+	type: array (2D)
+"""
+def yellow_mask(image):
+	color_min, color_max = yellow_range()
+	return create_mask(image, color_min, color_max)
+
+
 """
 returns a tuple of colorMin and colorMax which
 contains the range of yellow colors for a license plate
@@ -73,72 +92,63 @@ def yellow_range():
 
 
 """
-Given a width, a height and an area, determine if 
-it is possible for an object of those dimensions to be
-a license plate.
+Filter the stats of connected components (as given by cv2.connectedComponentsWithStats) on size,
+all at once. A component survives iff all of its values are strictly within the given bounds.
 
-Inputs:(Three)
-	1. width: width of the object
-	type: int
-	2. height: height of the object
-	type: int
-	3. area: amount of pixels that it fills
-	type: int
+Inputs:(Nine)
+	1. stats: stats of the connected components, a row of left, top, width, height and area per component
+	type: 2D array
+	2. min_width, max_width: bounds on the width
+	type: number
+	4. min_height, max_height: bounds on the height
+	type: number
+	6. min_area, max_area: bounds on the area
+	type: number
+	8. min_ratio, max_ratio: bounds on the ratio of width to height, None to not check the ratio
+	type: number or None
 
 Outputs:(One)
-	1. boolean: true if it cannot be a license plate, false otherwise
-"""
-def is_not_license_plate_prelim(width, height, area):
-	if size_is_off(width, height, area):
-		return True
-	return False
-
-
-"""
-Given a mask, determine if it could be a license plate.
-
-Inputs:(One)
-	1. mask: the cropped mask given by localization
+	1. stats: the rows of the components that survived, in the original order
 	type: 2D array
-Outputs:(One)
-	1. boolean: true if it cannot be a license plate, false otherwise
 """
-def is_not_license_plate(mask):
-	return ratio_is_wrong(mask) or components_not_connected(mask) or fill_ratio_not_satisfied(mask)
+def filter_stats(stats, min_width, max_width, min_height, max_height, min_area, max_area, min_ratio=None, max_ratio=None):
+	width = stats[:, cv2.CC_STAT_WIDTH]
+	height = stats[:, cv2.CC_STAT_HEIGHT]
+	area = stats[:, cv2.CC_STAT_AREA]
+	keep = (min_width < width) & (width < max_width)
+	keep &= (min_height < height) & (height < max_height)
+	keep &= (min_area < area) & (area < max_area)
+	if min_ratio is not None:
+		ratio = width / height
+		keep &= (min_ratio < ratio) & (ratio < max_ratio)
+	return stats[keep]
 
 
 """
-Given a mask, determine if the ratio is that of a license plate.
+Get the connected components that could be license plates based on their size,
+with all size checks done at once over the whole stats array.
 
-Inputs:(One)
-	1. mask: the cropped mask given by localization
+Inputs:(Two)
+	1. stats: stats of the connected components, a row of left, top, width, height and area per component
 	type: 2D array
-Outputs:(One)
-	1. boolean: true if it cannot be a license plate, false otherwise
-"""
-def ratio_is_wrong(mask):
-	ratio = len(mask)/len(mask[0])
-	return not MIN_RATIO < ratio < MAX_RATIO
-
-
-"""
-Given a mask, determine if the amount of connected components exceeds the
-possible amount from a mask corresponding to that of a license plate.
+	2. scale: factor the image was downscaled by, the size constants are scaled to match
+	type: int
 
-Inputs:(One)
-	1. mask: the cropped mask given by localization
-	type: 2D array
 Outputs:(One)
-	1. boolean: true if it cannot be a license plate, false otherwise
+	1. stats: the rows of the components that could be license plates
+	type: 2D array
 """
-def components_not_connected(mask):
-	stats = cv2.connectedComponentsWithStats(mask, 4)[2]
-	return len(stats) > 2
+def plate_candidates(stats, scale = 1):
+	return filter_stats(stats, MIN_WIDTH / scale, MAX_WIDTH / scale, MIN_HEIGHT / scale, MAX_HEIGHT / scale,
+						MIN_SIZE / scale ** 2, MAX_SIZE / scale ** 2)
 
 
 """
-Given a mask, determine if the mask fills up the space it occupies
-enough to be a potential license plate.
+Given a mask, determine if it could be a license plate. The checks are done from cheapest to most
+expensive, returning at the first one that fails, and none of them allocates a temporary image:
+	1. the ratio of height to width must be that of a license plate
+	2. the mask must fill up enough of the space it occupies
+	3. the mask must consist of a single connected component (the only labelled pass)
 
 Inputs:(One)
 	1. mask: the cropped mask given by localization
@@ -146,34 +156,17 @@ Inputs:(One)
 Outputs:(One)
 	1. boolean: true if it cannot be a license plate, false otherwise
 """
-def fill_ratio_not_satisfied(mask):
-	comparator = np.zeros(mask.shape)
-	xor = np.logical_xor(mask, comparator)
-	fill_ratio = np.sum(xor) / mask.size
-	return fill_ratio < MIN_FILL
-
-
-"""
-Given a width, a height and an area, determine if 
-it is possible for an object of those dimensions to be
-a license plate.
-
-Inputs:(Three)
-	1. width: width of the object
-	type: int
-	2. height: height of the object
-	type: int
-	3. area: amount of pixels that it fills
-	type: int
-
-Outputs:(One)
-	1. boolean: true if it cannot be a license plate, false otherwise
-"""
-def size_is_off(width, height, area):
-	width_bool = MIN_WIDTH < width < MAX_WIDTH
-	height_bool = MIN_HEIGHT < height < MAX_HEIGHT
-	size_bool = MIN_SIZE < area < MAX_SIZE
-	return not (width_bool and height_bool and size_bool)
+def is_not_license_plate(mask):
+	height, width = mask.shape[:2]
+	if height == 0 or width == 0:
+		return True
+	if not MIN_RATIO < height / width < MAX_RATIO:
+		return True
+	if cv2.countNonZero(mask) / mask.size < MIN_FILL:
+		return True
+	# amount of labels including the background
+	components = cv2.connectedComponents(mask, connectivity=4)[0]
+	return components > 2
 
 
 """
@@ -193,8 +186,7 @@ Outputs:(Two)
 	type: 2D array
 """
 def refit_image(image, mask):
-	color_min, color_max = yellow_range()
-	new_mask = create_mask(image, color_min, color_max)
+	new_mask = yellow_mask(image)
 
 	stats = cv2.connectedComponentsWithStats(new_mask, 4)[2]
 	index_max_area = np.argmax(stats, axis=0)[4]
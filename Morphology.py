@@ -1,4 +1,9 @@
 import cv2
+import numpy as np
+from Classes import BoundingBox, merge_overlapping
+
+# side of the tiles the sparse morphology looks for foreground in
+SPARSE_TILE = 8
 
 # Structuring elements
 # rectangles
@@ -27,21 +32,83 @@ CROSS_10 = cv2.getStructuringElement(cv2.MORPH_CROSS, (10, 10))
 """
 Denoise an image by morphology
 
-Inputs:(One)
+Inputs:(Three)
     1. image: image to denoise
     type: array with dimension >= 2
+    2. scale: factor the image was downscaled by, the kernels are scaled down to match
+    type: int
+    3. options: localization options, None for the defaults
+    type: Options
 Outputs:(One)
     1. denoised: denoised image
     type: array with dimension >= 2 (same as original image)
 """
-def denoise(image):
+def denoise(image, scale=1, options=None):
+    open_kernel, close_kernel = ELLIPSE_7, ELLIPSE_12
+    if scale > 1:
+        open_kernel = ellipse(max(1, round(7 / scale)))
+        close_kernel = ellipse(max(1, round(12 / scale)))
     denoised = image
-    denoised = cv2.morphologyEx(denoised, cv2.MORPH_OPEN, ELLIPSE_7)
-    denoised = cv2.morphologyEx(denoised, cv2.MORPH_CLOSE, ELLIPSE_12)
-    denoised = cv2.dilate(denoised, ELLIPSE_12)
+    denoised = cv2.morphologyEx(denoised, cv2.MORPH_OPEN, open_kernel)
+    if options is not None and options.morphology == 'sparse':
+        return close_and_dilate_sparse(denoised, close_kernel)
+    denoised = cv2.morphologyEx(denoised, cv2.MORPH_CLOSE, close_kernel)
+    denoised = cv2.dilate(denoised, close_kernel)
     return denoised
 
 
+"""
+Close and then dilate a mask with the same kernel, only around its foreground.
+After the opening most of a frame is background, which closing and dilating keep as it is.
+The foreground is looked for in tiles of SPARSE_TILE pixels. The tiles are padded by more than
+the closing and dilation can reach, so working on the padded regions gives exactly the same mask
+as working on the whole image.
+
+Inputs:(Two)
+    1. mask: binary mask to close and dilate
+    type: 2D array
+    2. kernel: structuring element of the closing and the dilation
+    type: 2D array
+Outputs:(One)
+    1. closed: closed and dilated mask
+    type: 2D array (same as mask)
+"""
+def close_and_dilate_sparse(mask, kernel):
+    height, width = mask.shape
+    # the closing and the dilation each reach less than the kernel size
+    padding = -(-2 * max(kernel.shape) // SPARSE_TILE)
+    padded = cv2.copyMakeBorder(mask, 0, -height % SPARSE_TILE, 0, -width % SPARSE_TILE, cv2.BORDER_CONSTANT, value=0)
+    tiles = cv2.resize(padded, (padded.shape[1] // SPARSE_TILE, padded.shape[0] // SPARSE_TILE), interpolation=cv2.INTER_AREA)
+    tiles = cv2.compare(tiles, 0, cv2.CMP_GT)
+    tiles = cv2.dilate(tiles, cv2.getStructuringElement(cv2.MORPH_RECT, (2 * padding + 1, 2 * padding + 1)))
+
+    regions = []
+    for stat in cv2.connectedComponentsWithStats(tiles, connectivity=8)[2][1:]:
+        regions.append(BoundingBox(stat[1] * SPARSE_TILE, (stat[1] + stat[3]) * SPARSE_TILE,
+                                   stat[0] * SPARSE_TILE, (stat[0] + stat[2]) * SPARSE_TILE))
+
+    closed = np.zeros_like(mask)
+    for region in merge_overlapping(regions):
+        window = mask[region.min_x:region.max_x, region.min_y:region.max_y]
+        window = cv2.morphologyEx(window, cv2.MORPH_CLOSE, kernel)
+        closed[region.min_x:region.max_x, region.min_y:region.max_y] = cv2.dilate(window, kernel)
+    return closed
+
+
+"""
+Get an elliptical structuring element of some size
+
+Inputs:(One)
+    1. size: width and height of the structuring element
+    type: int
+Outputs:(One)
+    1. kernel: the structuring element
+    type: 2D array
+"""
+def ellipse(size):
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+
+
 """
 Denoise a license plate after binarization. This is done based on the size
 of the image.
@@ -0,0 +1,216 @@
+import time
+import queue
+import threading
+import itertools
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+import Localization
+
+
+# marks the end of the items produced by a background stage
+END = object()
+# seconds a background stage waits on a full queue before checking whether the consumer stopped
+PUT_TIMEOUT = 0.1
+# seconds the decoding stage waits between checks whether a sparse adaptive sampler learned about the last frame
+SAMPLER_POLL = 0.001
+
+# shared memory frame slots and localization options, set once per localization worker process
+worker_slots = []
+worker_options = None
+
+
+"""
+Run an iterable on a background thread, handing its items over through a bounded queue.
+Used for decoding, so that the next frames are decoded while the current ones are processed.
+When the consumer stops early (for example because it raised), the background thread stops as well.
+While an adaptive sampler is sparse, the next item is only taken from the iterable once the sampler was told
+about the previous one, so the stride of the next frame follows the last localized frame.
+
+Inputs:(Three)
+	1. iterable: the iterable to run in the background
+	type: iterable
+	2. queue_size: maximum amount of items that are produced ahead of the consumer
+	type: int
+	3. sampler: adaptive sampler the items are sampled by, None if they are sampled with a fixed stride
+	type: AdaptiveSampler or None
+Outputs:(One)
+	1. items: generator of the items of the iterable, in order
+	type: generator
+"""
+def prefetch(iterable, queue_size, sampler = None):
+	items = queue.Queue(maxsize=queue_size)
+	errors = []
+	# set when the consumer stops, so the producer does not block forever on a full queue
+	stop = threading.Event()
+
+	def put(item):
+		while not stop.is_set():
+			try:
+				items.put(item, timeout=PUT_TIMEOUT)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def produce():
+		try:
+			produced = 0
+			for item in iterable:
+				if not put(item):
+					break
+				produced += 1
+				while sampler is not None and sampler.is_sparse() and sampler.updates() < produced and not stop.is_set():
+					time.sleep(SAMPLER_POLL)
+		except Exception as e:
+			errors.append(e)
+		finally:
+			# release what the iterable holds (such as an open video) on this thread
+			if stop.is_set() and hasattr(iterable, 'close'):
+				iterable.close()
+			put(END)
+
+	thread = threading.Thread(target=produce, daemon=True)
+	thread.start()
+	try:
+		while True:
+			item = items.get()
+			if item is END:
+				break
+			yield item
+	finally:
+		stop.set()
+		# drop the items produced ahead, so they are freed right away
+		while not items.empty():
+			items.get_nowait()
+	if len(errors) > 0:
+		raise errors[0]
+
+
+"""
+Apply a function to every item of an iterable on a pool of worker threads.
+At most queue_size items are in flight at a time and results are yielded in input order.
+While an adaptive sampler is sparse only one item is in flight, so its result reaches the sampler
+before the next item is taken.
+
+Inputs:(Five)
+	1. func: function to apply to each item
+	type: function
+	2. iterable: items to apply the function to
+	type: iterable
+	3. workers: amount of worker threads
+	type: int
+	4. queue_size: maximum amount of items submitted ahead of the consumer
+	type: int
+	5. sampler: adaptive sampler the items are sampled by, None if they are sampled with a fixed stride
+	type: AdaptiveSampler or None
+Outputs:(One)
+	1. results: generator of the results of func, in input order
+	type: generator
+"""
+def ordered_map(func, iterable, workers, queue_size, sampler = None):
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		pending = deque()
+		for item in iterable:
+			pending.append(executor.submit(func, item))
+			in_flight = 1 if sampler is not None and sampler.is_sparse() else queue_size
+			while len(pending) >= in_flight:
+				yield pending.popleft().result()
+		while len(pending) > 0:
+			yield pending.popleft().result()
+
+
+"""
+Attach a localization worker process to the shared memory frame slots
+
+Inputs:(Two)
+	1. names: names of the shared memory blocks, one per slot
+	type: list(string)
+	2. options: localization options
+	type: Options
+Outputs:(Zero)
+"""
+def attach_frame_slots(names, options):
+	global worker_slots, worker_options
+	worker_slots = [shared_memory.SharedMemory(name=name) for name in names]
+	worker_options = options
+
+
+"""
+Localize plates in a frame stored in a shared memory slot, in a worker process.
+Only the plate crops and bounding boxes are sent back, the frame itself is never pickled.
+
+Inputs:(Four)
+	1. slot: index of the slot holding the frame
+	type: int
+	2. frame_nr: frame number of the frame
+	type: int
+	3. shape: shape of the frame
+	type: tuple
+	4. dtype: data type of the frame
+	type: string
+Outputs:(One)
+	1. localized: frame number and list of plate images and bounding boxes
+	type: (int, list of pairs of image and BoundingBox)
+"""
+def localize_frame_slot(slot, frame_nr, shape, dtype):
+	image = np.ndarray(shape, dtype=dtype, buffer=worker_slots[slot].buf)
+	plates = Localization.plate_detection(image, worker_options)
+	# copy the crops out of the shared frame, which is overwritten once this result is consumed
+	return frame_nr, [(plate.copy(), bb) for plate, bb in plates]
+
+
+"""
+Localize plates in frames on a pool of worker processes.
+Frames are copied into a ring of queue_size shared memory slots, a slot is reused once the result
+of the frame in it has been consumed. Results are yielded in frame order.
+Frames without an image (skipped by the frame gate) are not sent to the workers and are localized as None.
+While an adaptive sampler is sparse only one frame is in flight, so it learns about every sparse frame
+before the next one is sampled and a short scene cannot be skipped.
+
+Inputs:(Five)
+	1. frames: iterable of frame number, timestamp and image (or None)
+	type: iterable of (int, float, 3D array or None)
+	2. workers: amount of worker processes
+	type: int
+	3. queue_size: amount of frame slots, i.e. maximum amount of frames in flight
+	type: int
+	4. options: localization options, None for the defaults
+	type: Options
+	5. sampler: adaptive sampler the frames are sampled by, which has to be told about each localized frame
+	before the next frame is taken from frames, None if the frames are sampled with a fixed stride
+	type: AdaptiveSampler or None
+Outputs:(One)
+	1. localized: generator of frame numbers and list of plate images and bounding boxes
+	type: generator of (int, list of pairs of image and BoundingBox)
+"""
+def localize_processes(frames, workers, queue_size, options = None, sampler = None):
+	frames = iter(frames)
+	first = next(frames, None)
+	if first is None:
+		return
+	# the first frame is never skipped by the frame gate
+	slots = [shared_memory.SharedMemory(create=True, size=first[2].nbytes) for _ in range(queue_size)]
+	try:
+		names = [slot.name for slot in slots]
+		with ProcessPoolExecutor(max_workers=workers, initializer=attach_frame_slots, initargs=(names, options)) as executor:
+			pending = deque()
+			for i, (frame_nr, _, image) in enumerate(itertools.chain([first], frames)):
+				slot = i % queue_size
+				if image is None:
+					skipped = Future()
+					skipped.set_result((frame_nr, None))
+					pending.append(skipped)
+				else:
+					np.ndarray(image.shape, dtype=image.dtype, buffer=slots[slot].buf)[:] = image
+					pending.append(executor.submit(localize_frame_slot, slot, frame_nr, image.shape, image.dtype.str))
+				in_flight = 1 if sampler is not None and sampler.is_sparse() else queue_size
+				while len(pending) >= in_flight:
+					yield pending.popleft().result()
+			while len(pending) > 0:
+				yield pending.popleft().result()
+	finally:
+		for slot in slots:
+			slot.close()
+			slot.unlink()
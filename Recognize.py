@@ -1,56 +1,189 @@
 import cv2
+import time
 import Enhance
 from Morphology import denoise_plate
 from LocalizationUtils import crop_image
-from Classes import Params
-from RecognizeUtils import resize_image, extract_characters, recognize_char,\
-	good_distance_between_bbs, valid_plate, convertArrayToString, overwrite_mistakes
+from Classes import Params, RecognitionCascade, hamming_distance
+from RecognizeUtils import resize_image, extract_characters, recognize_chars,\
+	good_distance_between_bbs, valid_plate, convertArrayToString, overwrite_mistakes, plate_hash
+
+
+# binarization technique (1 is adaptive thresholding, 2 is isoData) and whether to
+# pre-process for category 3, in the order they are tried in by default
+STRATEGIES = [(1, False), (2, False), (1, True), (2, True)]
+# attempts, successes and time of each strategy
+cascade = RecognitionCascade(["adaptive", "isodata", "adaptive cat3", "isodata cat3"])
+# number of plate hashes a recognition cache remembers the recognized plates for
+RECOGNITION_CACHE_ENTRIES = 256
+# highest hash tolerance of a recognition cache, plates with different labels in the
+# recognition dataset differ in at least 7 bits
+MAX_HASH_TOLERANCE = 4
 
 
 """
 Given (hopefully) a license plate as an input image, segments and
 recognizes the characters of the license plate, and returns the 
 recognized plate as a string.
+The strategies in STRATEGIES are tried one after another until one
+gives a valid plate. Each pre-processing is done only once and shared
+by the strategies that use it.
 
 Inputs:(Two)
-	1. plate_imgs: cropped plate image by Localization.plate_detection function
+	1. plate_img: cropped plate image by Localization.plate_detection function
 	type: 3D numpy array
-	2. binarize_technique: technique used to binarize the image,
-	1 is adaptive thresholding, 2 is isoData
-	type: int
+	2. options: recognition options, None for the defaults.
+	With options.cascade 'adaptive' the strategies are tried in order of their success rate so far.
+	type: Options
 Outputs:(One)
-	1. final_plate: recognized plate characters
+	1. final_plate: recognized plate characters, None if no strategy gave a valid plate
 	type: string
 """
-def segment_and_recognize(plate_img, binarize_technique = 1, is_cat3= False):
-	## first, pre-process the image
-	copy = pre_process_image(plate_img, is_cat3)
+def segment_and_recognize(plate_img, options = None):
+	return segment_and_recognize_batch([plate_img], options)[0]
+
+
+"""
+Segment and recognize the characters of a number of license plates,
+for example all plates of a scene, like segment_and_recognize does
+for each of them.
+With a cache, plates whose hash differs in at most options.hash_tolerance
+bits (capped at MAX_HASH_TOLERANCE) from the hash of a plate in the cache
+get the plate recognized for it, without segmenting them at all. The
+cache should only hold plates of the same scene, so plates of other
+cars are never returned.
 
-	# calculate parameters for the image
-	params = Params(len(copy[0]), len(copy))
+Inputs:(Three)
+	1. plate_imgs: cropped plate images by Localization.plate_detection function
+	type: list of 3D numpy arrays
+	2. options: recognition options, None for the defaults.
+	With options.cascade 'adaptive' the strategies are tried in order of their success rate so far.
+	type: Options
+	3. cache: recognized plates by plate hash, None to recognize every plate
+	type: RecognitionCache or None
+Outputs:(One)
+	1. final_plates: recognized plate characters of each plate, None for the plates no strategy gave a valid plate for
+	type: list of strings
+"""
+def segment_and_recognize_batch(plate_imgs, options = None, cache = None):
+	tolerance = min(options.hash_tolerance, MAX_HASH_TOLERANCE) if options is not None else -1
+	if cache is None or tolerance < 0:
+		return run_strategies(plate_imgs, options)
 
-	## binarize and denoise based on image size
-	copy = binarize_and_denoise(copy, binarize_technique)
+	final_plates = [None] * len(plate_imgs)
+	hashes = [plate_hash(plate_img) for plate_img in plate_imgs]
+	pending = list(range(len(plate_imgs)))
+	while len(pending) > 0:
+		misses = []
+		waiting = []
+		for i in pending:
+			# a plate that looks like a plate of this batch that is not cached yet waits for it to be recognized,
+			# so it is found in the cache in the next round
+			if any(hamming_distance(hashes[i], hashes[j]) <= tolerance for j in misses):
+				waiting.append(i)
+				continue
+			found, final_plates[i] = cache.get(hashes[i], tolerance)
+			if not found:
+				misses.append(i)
+		for i, final_plate in zip(misses, run_strategies([plate_imgs[i] for i in misses], options)):
+			final_plates[i] = final_plate
+			cache.put(hashes[i], final_plate)
+		pending = waiting
+	return final_plates
 
-	## find the connected components and extract the ones which
-	## are likely to be characters
-	stats = cv2.connectedComponentsWithStats(copy, 4)[2]
-	listOfChars = extract_characters(stats, params)
 
-	## recognize the characters
-	recognized_plate = recognize_plate(listOfChars, copy)
+"""
+Segment and recognize the characters of a number of license plates
+with the strategies in STRATEGIES. Each strategy is run on all plates
+that do not have a valid plate yet, and the characters of all of those
+plates are scored against the reference characters in one go.
 
-	## convert to a string and check if the result is a valid plate
+Inputs:(Two)
+	1. plate_imgs: cropped plate images by Localization.plate_detection function
+	type: list of 3D numpy arrays
+	2. options: recognition options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. final_plates: recognized plate characters of each plate, None for the plates no strategy gave a valid plate for
+	type: list of strings
+"""
+def run_strategies(plate_imgs, options = None):
+	reorder = options is not None and options.cascade == 'adaptive'
+	final_plates = [None] * len(plate_imgs)
+	# pre-processed images and their parameters per plate, by whether they were pre-processed for category 3
+	pre_processed = [{} for _ in plate_imgs]
+	pending = list(range(len(plate_imgs)))
+	for index in cascade.order(reorder):
+		if len(pending) == 0:
+			break
+		binarize_technique, is_cat3 = STRATEGIES[index]
+		tic = time.perf_counter()
+
+		segmented = []
+		for i in pending:
+			## first, pre-process the image and calculate parameters for it
+			if is_cat3 not in pre_processed[i]:
+				copy = pre_process_image(plate_imgs[i], is_cat3)
+				pre_processed[i][is_cat3] = (copy, Params(len(copy[0]), len(copy)))
+			copy, params = pre_processed[i][is_cat3]
+
+			## binarize and denoise based on image size
+			binarized = binarize_and_denoise(copy, binarize_technique)
+			segmented.append((binarized, find_characters(binarized, params)))
+
+		## recognize the characters of all plates at once
+		characters = [crop_image(bounding_box, binarized) for binarized, listOfChars in segmented
+					  for bounding_box in listOfChars]
+		recognized_chars = recognize_chars(characters, options)
+
+		still_pending = []
+		first = 0
+		for i, (binarized, listOfChars) in zip(pending, segmented):
+			recognized_plate = join_characters(listOfChars, recognized_chars[first:first + len(listOfChars)], binarized)
+			first += len(listOfChars)
+			final_plates[i] = to_valid_plate(recognized_plate)
+			if final_plates[i] is None:
+				still_pending.append(i)
+		# the time of the strategy is shared equally by the plates it ran on
+		seconds = (time.perf_counter() - tic) / len(pending)
+		for i in pending:
+			cascade.record(index, final_plates[i] is not None, seconds)
+		pending = still_pending
+	return final_plates
+
+
+"""
+Find the connected components of a binarized plate and extract the
+ones which are likely to be characters
+
+Inputs:(Two)
+	1. image: binarized and denoised plate image
+	type: 2D numpy array
+	2. params: the size parameters of the plate image
+	type: Params
+Outputs:(One)
+	1. listOfChars: bounding boxes likely to contain characters
+	type: list containing instances of BoundingBox class, defined in Classes.py
+"""
+def find_characters(image, params):
+	stats = cv2.connectedComponentsWithStats(image, 4)[2]
+	return extract_characters(stats, params)
+
+
+"""
+Convert recognized characters to a string, fix common mistakes and
+check if the result is a valid plate
+
+Inputs:(One)
+	1. recognized_plate: recognized characters and dashes
+	type: list of chars
+Outputs:(One)
+	1. final_plate: recognized plate characters, None if the result is not a valid plate
+	type: string
+"""
+def to_valid_plate(recognized_plate):
 	final_plate = convertArrayToString(recognized_plate)
 	final_plate = overwrite_mistakes(final_plate)
-	is_valid = valid_plate(final_plate)
-
-	## if not valid, we repeat with isoData and not adaptive
-	if not is_valid and binarize_technique == 1:
-		return segment_and_recognize(plate_img, 2, is_cat3)
-	if not is_valid and binarize_technique == 2 and not is_cat3:
-		return segment_and_recognize(plate_img, 1, True)
-	return final_plate.upper() if is_valid else None
+	return final_plate.upper() if valid_plate(final_plate) else None
 
 
 """
@@ -95,7 +228,7 @@ Outputs:(One)
 """
 def binarize_and_denoise(image, binarize_technique):
 	if binarize_technique == 1:
-		image = Enhance.binarize_adaptive(image, 1)
+		image = Enhance.binarize_adaptive(image)
 	if binarize_technique == 2:
 		image = Enhance.binarize(image, 1)
 	image = denoise_plate(image)
@@ -103,20 +236,21 @@ def binarize_and_denoise(image, binarize_technique):
 
 
 """
-Given a list of bounding boxes that most likely contain characters, 
-recognizes the characters. Also adds dashes between characters that
-have a separation larger than a given threshold.
+Put recognized characters in order, adding dashes between characters
+that have a separation larger than a given threshold.
 
-Inputs:(Two)
-	1. listOfChars: a list of bounding boxes likely to contain characters
+Inputs:(Three)
+	1. listOfChars: bounding boxes of the characters
 	type: list containing instances of BoundingBox class, defined in Classes.py
-	2. image: image to obtain the characters from
+	2. recognized_chars: the recognized character of each bounding box
+	type: list of chars
+	3. image: image the characters were obtained from
 	type: 2D numpy array
 Outputs:(One)
-	1. recognized_plate: a list of all the characters that were recognized
+	1. recognized_plate: the recognized characters and dashes
 	type: list of chars
 """
-def recognize_plate(listOfChars, image):
+def join_characters(listOfChars, recognized_chars, image):
 	recognized_plate = []
 	for i in range(len(listOfChars)):
 		bounding_box = listOfChars[i]
@@ -125,9 +259,7 @@ def recognize_plate(listOfChars, image):
 		if i + 1 < len(listOfChars):
 			next_bounding_box = listOfChars[i + 1]
 
-		cropped_image = crop_image(bounding_box, image)
-		recognized_char = recognize_char(cropped_image)
-		recognized_plate.append(recognized_char)
+		recognized_plate.append(recognized_chars[i])
 		if next_bounding_box is not None and good_distance_between_bbs(bounding_box, next_bounding_box, len(image[0])):
 			recognized_plate.append('-')
 
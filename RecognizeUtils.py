@@ -1,7 +1,10 @@
+import os
 import cv2
 import re
+import threading
 import numpy as np
-from Classes import BoundingBox
+from Classes import BoundingBox, TemplateBank
+from LocalizationUtils import filter_stats
 
 
 MIN_SIDE_RATIO = 0.2
@@ -9,6 +12,29 @@ MAX_SIDE_RATIO = 0.9
 
 MAX_DIST_DASH_RATIO = 0.055
 
+# memory the differences between characters and reference characters may take up at once
+DIFFERENCE_BYTES = 16 * 2 ** 20
+
+# folders of the reference characters, relative to this file so they are found from any working directory
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset")
+LETTERS_DIR = os.path.join(DATASET_DIR, "SameSizeLetters")
+NUMBERS_DIR = os.path.join(DATASET_DIR, "SameSizeNumbers")
+# every character has a straight, a left and a right leaning reference
+REFERENCE_VARIANTS = ("", "_left", "_right")
+
+# grid the packed matcher normalizes characters and reference characters to
+CANONICAL_WIDTH = 24
+CANONICAL_HEIGHT = 40
+# number of set bits in each byte, for numpy versions without a popcount
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], np.uint8)
+
+# zones per side of the zoning histogram and bins of the row and column profiles of the pruning descriptors
+DESCRIPTOR_ZONES = 4
+DESCRIPTOR_PROFILE_BINS = 8
+
+# rows and columns of the difference hash of plate images, giving a hash of 64 bits
+PLATE_HASH_SIZE = 8
+
 
 """
 Given a filepath and a filename, load the image.
@@ -29,19 +55,87 @@ def loadImage(filepath, filename, grayscale=True):
 ## Initializes the characters and the numbers for the dataset
 letter_set = set(['b','d','f','g','h','j','k','l','m','n','p','r','s','t','v','x','z'])
 number_set = set(['0','1','2','3','4','5','6','7','8','9'])
-reference_characters = {}
-for char in letter_set:
-	list = []
-	list.append(loadImage("dataset/SameSizeLetters/", char +".bmp"))
-	list.append(loadImage("dataset/SameSizeLetters/", char + "_left.bmp"))
-	list.append(loadImage("dataset/SameSizeLetters/", char + "_right.bmp"))
-	reference_characters[char] = list
-for char in number_set:
-	list = []
-	list.append(loadImage("dataset/SameSizeNumbers/", char + ".bmp"))
-	list.append(loadImage("dataset/SameSizeNumbers/", char + "_left.bmp"))
-	list.append(loadImage("dataset/SameSizeNumbers/", char + "_right.bmp"))
-	reference_characters[char] = list
+# the reference characters, resized to the size of the segmented characters on demand, loaded on first use
+template_bank = None
+template_bank_lock = threading.Lock()
+# the reference characters packed on the canonical grid, see get_packed_references
+packed_references = None
+# the descriptors of the reference characters, see get_reference_descriptors
+reference_descriptors = None
+
+
+"""
+Find a file in a folder, ignoring the case of its name.
+The reference characters are named in upper and lower case,
+which only matters on case sensitive file systems.
+
+Inputs:(Two)
+	1. directory: folder to look in
+	type: string
+	2. filename: name of the file, in any case
+	type: string
+Outputs:(One)
+	1. filename: name of the file as it is in the folder
+	type: string
+"""
+def find_file(directory, filename):
+	if os.path.exists(os.path.join(directory, filename)):
+		return filename
+	for name in sorted(os.listdir(directory)):
+		if name.lower() == filename.lower():
+			return name
+	raise FileNotFoundError("Reference character " + filename + " not found in " + directory)
+
+
+"""
+List the images of the reference characters, letters first.
+
+Inputs:(Zero)
+Outputs:(One)
+	1. references: label and path of each reference character
+	type: list of pairs of char and string
+"""
+def reference_files():
+	references = []
+	for characters, directory in ((letter_set, LETTERS_DIR), (number_set, NUMBERS_DIR)):
+		for char in sorted(characters):
+			for variant in REFERENCE_VARIANTS:
+				references.append((char, os.path.join(directory, find_file(directory, char + variant + ".bmp"))))
+	return references
+
+
+"""
+Load the reference characters from their images.
+
+Inputs:(Zero)
+Outputs:(One)
+	1. references: label and image of each reference character
+	type: list of pairs of char and 2D array
+"""
+def load_reference_characters():
+	references = []
+	for char, path in reference_files():
+		image = loadImage(os.path.dirname(path) + os.sep, os.path.basename(path))
+		if image is None:
+			raise IOError("Could not read reference character " + path)
+		references.append((char, image))
+	return references
+
+
+"""
+Get the bank of reference characters, loading it the first time.
+
+Inputs:(Zero)
+Outputs:(One)
+	1. template_bank: the reference characters
+	type: TemplateBank
+"""
+def get_template_bank():
+	global template_bank
+	with template_bank_lock:
+		if template_bank is None:
+			template_bank = TemplateBank(load_reference_characters())
+	return template_bank
 
 
 """
@@ -60,6 +154,23 @@ def recognize_char(image):
 	return recognized_char
 
 
+"""
+Given the characters of a plate, find for each the character with
+the lowest xor score to the ones in our dataset, in one go.
+
+Inputs:(Two)
+	1. images: segmented characters to be recognized
+	type: list of 2D arrays
+	2. options: recognition options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. recognized_chars: the recognized characters
+	type: list of chars
+"""
+def recognize_chars(images, options=None):
+	return give_labels_lowest_score(images, options)
+
+
 """
 Given the bounding boxes of the connected components of
 an image, determine which of these could potentially be 
@@ -76,50 +187,216 @@ Outputs:(One)
 	type: list
 """
 def extract_characters(stats, params):
+	chars = filter_stats(stats, params.min_width, params.max_width, params.min_height, params.max_height,
+						 params.min_size, params.max_size, MIN_SIDE_RATIO, MAX_SIDE_RATIO)
+	# order from left to right, components starting at the same column in reverse order of labelling
+	order = np.lexsort((-np.arange(len(chars)), chars[:, 0]))
 	result = []
-	for stat in stats:
-		min_x = stat[0]
-		min_y = stat[1]
-		width = stat[2]
-		height = stat[3]
-		area = stat[4]
+	for min_x, min_y, width, height, _ in chars[order]:
+		result.append(BoundingBox(min_y, min_y + height, min_x, min_x + width))
+	return result
 
-		bounding_box = BoundingBox(min_y, min_y + height, min_x, min_x + width)
 
-		side_ratio = width / height
+"""
+Calculate the difference between each of a number of characters
+and each of the reference characters, by computing an xor of the
+images and summing up the resulting values. Characters of the same
+size are scored against the stacked reference characters at once.
 
-		if not_character(width, height, area, side_ratio, params):
-			continue
+Inputs:(One)
+	1. test_images: segmented characters from a plate
+	type: list of 2D arrays
+Outputs:(One)
+	1. scores: the difference between the ith character and the
+	jth reference character (in the order of template_bank.labels)
+	type: 2D array of shape (characters, reference characters)
+"""
+def difference_scores(test_images):
+	template_bank = get_template_bank()
+	scores = np.empty((len(test_images), len(template_bank.labels)), np.uint32)
+	by_size = {}
+	for i, test_image in enumerate(test_images):
+		by_size.setdefault(test_image.shape, []).append(i)
+	for (height, width), indices in by_size.items():
+		references = template_bank.resized(width, height)
+		# the characters of a whole chunk of a scene can share a size, so compare them in chunks of bounded memory
+		chunk = max(1, DIFFERENCE_BYTES // references.nbytes)
+		for start in range(0, len(indices), chunk):
+			chunk_indices = indices[start:start + chunk]
+			characters = np.stack([test_images[i] for i in chunk_indices])
+			xor = np.bitwise_xor(characters[:, np.newaxis], references)
+			# a sum of at most 255 per pixel cannot overflow for any character that fits on a plate
+			scores[chunk_indices] = xor.reshape(len(chunk_indices), len(references), -1).sum(axis=2, dtype=np.uint32)
+	return scores
 
-		index = 0
 
-		for j in range(len(result)):
-			bb = result[j]
-			if bb.min_y < min_x:
-				index += 1
+"""
+Normalize binary characters to the canonical grid and pack them
+into bits, one bit per pixel of the grid.
 
-		result.insert(index, bounding_box)
-	return result
+Inputs:(One)
+	1. images: the binary characters
+	type: list of 2D arrays
+Outputs:(One)
+	1. packed: the bits of each character on the canonical grid
+	type: 2D array of uint8 of shape (characters, bytes)
+"""
+def pack_characters(images):
+	canonical = np.stack([cv2.resize(image, (CANONICAL_WIDTH, CANONICAL_HEIGHT), interpolation=cv2.INTER_AREA)
+						  for image in images])
+	return np.packbits(canonical.reshape(len(images), -1) > 127, axis=1)
 
 
 """
-Given two images, calculate the difference between them 
-by computing an xor of the images and summing up 
-the resulting values.
+Count the set bits of each element of an array, with the popcount
+of numpy when it has one and a lookup table otherwise.
 
-Inputs:(Two)
-	1. test_image: our segmented character from the plate
-	type: 2D array
-	2. reference_character: a character in the dataset
-	type: 2D array
+Inputs:(One)
+	1. array: the array to count the bits of
+	type: array of uint8
+Outputs:(One)
+	1. counts: the number of set bits of each element
+	type: array of uint8 (same shape as array)
+"""
+def count_bits(array):
+	if hasattr(np, 'bitwise_count'):
+		return np.bitwise_count(array)
+	return np.take(POPCOUNT, array)
+
+
+"""
+Get the reference characters packed on the canonical grid,
+packing them the first time.
+
+Inputs:(Zero)
+Outputs:(One)
+	1. packed_references: the packed reference characters
+	(in the order of template_bank.labels)
+	type: 2D array of shape (reference characters, bytes)
+"""
+def get_packed_references():
+	global packed_references
+	if packed_references is None:
+		packed_references = pack_characters(get_template_bank().templates)
+	return packed_references
+
+
+"""
+Calculate the difference between each of a number of characters
+and each of the reference characters on the canonical grid, by
+counting the bits in which the packed characters differ.
+
+Inputs:(One)
+	1. test_images: segmented characters from a plate
+	type: list of 2D arrays
+Outputs:(One)
+	1. scores: the difference between the ith character and the
+	jth reference character (in the order of template_bank.labels)
+	type: 2D array of shape (characters, reference characters)
+"""
+def packed_difference_scores(test_images):
+	xor = np.bitwise_xor(pack_characters(test_images)[:, np.newaxis], get_packed_references())
+	return count_bits(xor).sum(axis=2, dtype=np.uint32)
+
+
+"""
+Describe binary characters by a few cheap features: the aspect
+ratio, the ink density, the ink density in each zone of a 4x4 grid
+and the ink density along the rows and along the columns.
+The features are independent of the size of the character.
+
+Inputs:(One)
+	1. images: the binary characters
+	type: list of 2D arrays
+Outputs:(One)
+	1. descriptors: the features of each character
+	type: 2D array of float32 of shape (characters, features)
+"""
+def describe_characters(images):
+	descriptors = []
+	for image in images:
+		ink = image.astype(np.float32) / 255
+		height, width = image.shape
+		zones = cv2.resize(ink, (DESCRIPTOR_ZONES, DESCRIPTOR_ZONES), interpolation=cv2.INTER_AREA)
+		rows = cv2.resize(ink, (1, DESCRIPTOR_PROFILE_BINS), interpolation=cv2.INTER_AREA)
+		columns = cv2.resize(ink, (DESCRIPTOR_PROFILE_BINS, 1), interpolation=cv2.INTER_AREA)
+		descriptors.append(np.concatenate([[height / (height + width), cv2.mean(ink)[0]],
+										   zones.ravel(), rows.ravel(), columns.ravel()]))
+	return np.array(descriptors, np.float32)
+
+
+"""
+Get the descriptors of the reference characters, computing them
+the first time.
+
+Inputs:(Zero)
 Outputs:(One)
-	1. sum: the difference between the images
+	1. reference_descriptors: the descriptors of the reference characters
+	(in the order of template_bank.labels)
+	type: 2D array of shape (reference characters, features)
+"""
+def get_reference_descriptors():
+	global reference_descriptors
+	if reference_descriptors is None:
+		reference_descriptors = describe_characters(get_template_bank().templates)
+	return reference_descriptors
+
+
+"""
+Calculate the difference between each of a number of characters
+and the reference characters with the closest descriptors, like
+difference_scores. Only top_k reference characters per character
+are resized and compared, the others get the highest score.
+
+Inputs:(Two)
+	1. test_images: segmented characters from a plate
+	type: list of 2D arrays
+	2. top_k: number of reference characters to compare each character to
 	type: int
+Outputs:(One)
+	1. scores: the difference between the ith character and the
+	jth reference character (in the order of template_bank.labels)
+	type: 2D array of shape (characters, reference characters)
+"""
+def pruned_difference_scores(test_images, top_k):
+	template_bank = get_template_bank()
+	scores = np.full((len(test_images), len(template_bank.labels)), np.iinfo(np.uint32).max, np.uint32)
+	distances = np.abs(describe_characters(test_images)[:, np.newaxis] - get_reference_descriptors()).sum(axis=2)
+	top_k = min(top_k, len(template_bank.labels))
+	for test_image, row, candidates in zip(test_images, scores, np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]):
+		# in the order of the labels, so the first reference character with the lowest score still wins ties
+		candidates = np.sort(candidates)
+		height, width = test_image.shape
+		xor = np.bitwise_xor(template_bank.resized_subset(width, height, candidates), test_image)
+		row[candidates] = xor.reshape(len(candidates), -1).sum(axis=1, dtype=np.uint32)
+	return scores
+
+
+"""
+Given a number of characters, find for each the character with
+the lowest xor score to the ones in our dataset.
+
+Inputs:(Two)
+	1. test_images: segmented characters to be recognized
+	type: list of 2D arrays
+	2. options: recognition options, None for the defaults
+	type: Options
+Outputs:(One)
+	1. labels: the recognized characters
+	type: list of chars
 """
-# !The test_image and reference_character must have the same shape
-def difference_score(test_image, reference_character):
-	xor = np.bitwise_xor(test_image, reference_character).astype(np.uint8)
-	return np.sum(xor)
+def give_labels_lowest_score(test_images, options=None):
+	if len(test_images) == 0:
+		return []
+	if options is not None and options.matcher == 'packed':
+		scores = packed_difference_scores(test_images)
+	elif options is not None and options.prune_top_k > 0:
+		scores = pruned_difference_scores(test_images, options.prune_top_k)
+	else:
+		scores = difference_scores(test_images)
+	# the first reference character with the lowest score wins ties
+	lowest = np.argmin(scores, axis=1)
+	return [get_template_bank().labels[i] for i in lowest]
 
 
 """
@@ -134,23 +411,27 @@ Outputs:(One)
 	type: char
 """
 def give_label_lowest_score(test_image):
-	# Get the difference score with each of the reference characters
-	# (or only keep track of the lowest score)
-	min_score = 100000000
-
-	for i in reference_characters:
-		list_of_chars = reference_characters[i]
+	return give_labels_lowest_score([test_image])[0]
 
-		for comparison_file in list_of_chars:
-			resized_image = resize_image(comparison_file, len(test_image[0]), len(test_image))
-			temp = difference_score(resized_image, test_image)
 
-			if temp < min_score:
-				min_score = temp
-				min_char = i
+"""
+Compute the difference hash of a plate image: the image is shrunk to
+a grayscale grid of 8 rows of 9 pixels, and each bit tells whether a
+pixel is brighter than its left neighbour. Plate images that look
+alike get hashes that differ in few bits.
 
-	# Return a single character based on the lowest score
-	return min_char
+Inputs:(One)
+	1. image: cropped plate image
+	type: 3D array
+Outputs:(One)
+	1. plate_hash: the difference hash
+	type: int
+"""
+def plate_hash(image):
+	grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+	small = cv2.resize(grey, (PLATE_HASH_SIZE + 1, PLATE_HASH_SIZE), interpolation=cv2.INTER_AREA)
+	bits = small[:, 1:] > small[:, :-1]
+	return int.from_bytes(np.packbits(bits).tobytes(), 'big')
 
 
 """
@@ -211,35 +492,6 @@ def good_distance_between_bbs(bb1, bb2, image_width):
 	return distance > image_width * MAX_DIST_DASH_RATIO
 
 
-"""
-Check whether the connected component is likely to be a 
-character based on the pre-computed parameters of the image 
-and the stats of the component.
-
-Inputs:(Five)
-	1. width: the width of the component
-	type: int
-	2. height: the height of the component
-	type: int
-	3. area: the area covered by the component
-	type: int
-	1. ratio: the ratio of width to height, of the component
-	type: int
-	1. params: the parameters to check against
-	type: instance of Params class
-Outputs:(One)
-	1. bool: false if the component is likely to 
-	contain a character
-	type: boolean
-"""
-def not_character(width, height, area, ratio, params):
-	width_bool = params.min_width < width < params.max_width
-	height_bool = params.min_height < height < params.max_height
-	size_bool = params.min_size < area < params.max_size
-	ratio_bool = MIN_SIDE_RATIO < ratio < MAX_SIDE_RATIO
-	return not (width_bool and height_bool and size_bool and ratio_bool)
-
-
 """
 Check whether a plate as a string is a valid license plate
 
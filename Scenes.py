@@ -28,42 +28,102 @@ def similar_bounding_boxes(bb1, bb2):
     return error < max_error
 
 
+"""
+Check if any bounding box of the current frame is similar to any bounding box of the previous frame
+
+Inputs:(Two)
+    1. bbs: bounding boxes of the current frame
+    type: list(BoundingBox)
+    2. prev_bbs: bounding boxes of the previous frame
+    type: list(BoundingBox)
+Outputs:(One)
+    1. any_similar: true iff at least one pair of bounding boxes is similar
+    type: boolean
+"""
+def any_similar_bounding_boxes(bbs, prev_bbs):
+    for bb in bbs:
+        for bb_prev in prev_bbs:
+            if similar_bounding_boxes(bb, bb_prev):
+                return True
+    return False
+
+
+"""
+Lazily divide localized frames into scenes based on location of bounding boxes, in chunks of at most
+chunk_frames frames. A chunk is yielded once it is full or the next scene starts (or the input ends),
+so at most one chunk of plates is kept in memory at a time, however long a scene lasts.
+
+Inputs:(Two)
+    1. localized: iterable of pairs of frame number and list of pairs of plate and bounding box, in frame order
+    type: iterable of (int, list of pairs of image and BoundingBox)
+    2. chunk_frames: maximum amount of frames in a chunk
+    type: int
+Outputs:(One)
+    1. chunks: generator of whether the chunk starts a new scene and the list of localized pairs in the chunk
+    type: generator of (boolean, list of (int, list of pairs of image and BoundingBox))
+"""
+def scene_chunks(localized, chunk_frames):
+    chunk = []
+    starts_scene = True
+    prev = None
+    for frame_nr, plates in localized:
+        bbs = [bb for _, bb in plates]
+        # start a new scene when none of the bounding boxes are similar to the previous frame
+        new_scene = prev is not None and not any_similar_bounding_boxes(bbs, prev)
+        if new_scene or len(chunk) >= chunk_frames:
+            yield starts_scene, chunk
+            chunk = []
+            starts_scene = new_scene
+        chunk.append((frame_nr, plates))
+        prev = bbs
+    if len(chunk) > 0:
+        yield starts_scene, chunk
+
+
 """
 Divide frames into scenes based on location of bounding boxes
 
 Inputs:(One)
-    1. localized: map of frame numbers to pair of plate and bounding box
-    type: dictionary int to pair of image and BoundingBox
+    1. localized: iterable of pairs of frame number and list of pairs of plate and bounding box, in frame order
+    type: iterable of (int, list of pairs of image and BoundingBox)
 Outputs:(One)
     1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
     type: 2D list of ints
 """
 def frames_to_scenes(localized):
     scenes = []
-    curr_scene = 0
+    # one frame at a time, so no plates are kept
+    for starts_scene, chunk in scene_chunks(localized, 1):
+        if starts_scene:
+            scenes.append([])
+        scenes[-1] += [frame_nr for frame_nr, _ in chunk]
+    return scenes
+
+
+"""
+Merge the scenes of consecutive shards of a video into the scenes of the whole video.
+The first scene of a shard continues the last scene before it iff any of the bounding boxes of its first frame
+is similar to any of the bounding boxes of the last localized frame before the shard, like in scene_chunks.
+
+Inputs:(One)
+    1. shards: per shard, in frame order, its scenes and the bounding boxes localized in its frames
+    type: list of (2D list of ints, dictionary int to list of BoundingBox)
+Outputs:(One)
+    1. scenes: list where the ith element contains a list of frame_numbers in the ith scene
+    type: 2D list of ints
+"""
+def stitch_scenes(shards):
+    scenes = []
     prev = None
-    for frame_nr, plates in localized.items():
-        bbs = []
-        for _, bb in plates:
-            bbs.append(bb)
-        if prev is None:
-            scenes.append([frame_nr])
-        else:
-            any_similar = False
-            # check if any of the bounding boxes in current frame are similar to any in the previous frame
-            for bb in bbs:
-                if prev is None:
-                    break
-                for bb_prev in prev:
-                    if similar_bounding_boxes(bb, bb_prev):
-                        any_similar = True
-                        break
-            if any_similar: # if similar add it to current scene
-                scenes[curr_scene].append(frame_nr)
-            else: # else create new scene
-                curr_scene += 1
-                scenes.append([frame_nr])
-        prev = bbs
+    for shard_scenes, localized_bbs in shards:
+        if len(shard_scenes) == 0:
+            continue
+        first = localized_bbs[shard_scenes[0][0]]
+        if prev is not None and any_similar_bounding_boxes(first, prev):
+            scenes[-1] = scenes[-1] + shard_scenes[0]
+            shard_scenes = shard_scenes[1:]
+        scenes += [list(scene) for scene in shard_scenes]
+        prev = localized_bbs[scenes[-1][-1]]
     return scenes
 
 
@@ -0,0 +1,110 @@
+import os
+import time
+import argparse
+import cv2
+import CaptureFrame_Process
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_frequencies', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    return args
+
+
+"""
+Decode a video the way loadFrames used to, reading (decoding and converting) every frame
+and only keeping every sample_frequency-th one.
+
+Inputs:(Two)
+    1. file_path: path to video file
+    type: string
+    2. sample_frequency: how often a frame should be taken
+    type: int
+Outputs:(One)
+    1. frame_nrs: frame numbers that were kept
+    type: list(int)
+"""
+def read_all(file_path, sample_frequency):
+    cap = cv2.VideoCapture(file_path)
+    frame_nrs = []
+    frame_count = 0
+    while cap.isOpened():
+        retval, frame = cap.read()
+        if not retval:
+            break
+        if frame_count % sample_frequency == 0:
+            frame_nrs.append(frame_count)
+        frame_count += 1
+    cap.release()
+    return frame_nrs
+
+
+"""
+Decode a video with frame_source, either grabbing past unsampled frames or seeking
+
+Inputs:(Three)
+    1. file_path: path to video file
+    type: string
+    2. sample_frequency: how often a frame should be taken
+    type: int
+    3. seek: whether frame_source should seek to the sampled frames
+    type: boolean
+Outputs:(One)
+    1. frame_nrs: frame numbers that were kept
+    type: list(int)
+"""
+def stream(file_path, sample_frequency, seek):
+    return [frame_nr for frame_nr, _, _ in CaptureFrame_Process.frame_source(file_path, sample_frequency, seek)]
+
+
+"""
+Time a decoding function, taking the best of a number of repeats
+
+Inputs:(Three)
+    1. decode: function to time, returning the kept frame numbers
+    type: function
+    2. repeats: how often to run it
+    type: int
+    3. args: arguments of decode
+    type: tuple
+Outputs:(Two)
+    1. best: lowest time in seconds
+    type: float
+    2. frame_nrs: frame numbers kept by the last run
+    type: list(int)
+"""
+def best_time(decode, repeats, *args):
+    best = float('inf')
+    frame_nrs = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        frame_nrs = decode(*args)
+        toc = time.perf_counter()
+        best = min(best, toc - tic)
+    return best, frame_nrs
+
+
+"""
+Benchmark decode time against the sample frequency for the training and validation videos
+"""
+if __name__ == '__main__':
+    args = get_args()
+    videos = []
+    for folder in ("training", "validation"):
+        if os.path.isdir(folder):
+            videos += [folder + "/" + f for f in sorted(os.listdir(folder)) if f.endswith(".mp4")]
+    if len(videos) == 0:
+        print("No training or validation videos found")
+    for video in videos:
+        print(video)
+        print('%10s' % 'stride', '%10s' % 'read', '%10s' % 'grab', '%10s' % 'seek', '%10s' % 'frames')
+        for sample_frequency in args.sample_frequencies:
+            read_time, expected = best_time(read_all, args.repeats, video, sample_frequency)
+            grab_time, grabbed = best_time(stream, args.repeats, video, sample_frequency, False)
+            seek_time, seeked = best_time(stream, args.repeats, video, sample_frequency, True)
+            if grabbed != expected or seeked != expected:
+                print("Warning: sampled frames differ from reading every frame")
+            print('%10d' % sample_frequency, '%10.4f' % read_time, '%10.4f' % grab_time, '%10.4f' % seek_time,
+                  '%10d' % len(expected))
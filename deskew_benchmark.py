@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import CaptureFrame_Process
+import Correction
+import Localization
+import LocalizationEvaluation
+from Classes import Options
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_frequency', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    return args
+
+
+"""
+Time a rotation correction per plate candidate, taking the best of a number of repeats
+
+Inputs:(Three)
+    1. correct: rotation correction taking an image and its mask
+    type: function
+    2. candidates: cropped images and masks of the plate candidates
+    type: list of pairs of image and mask
+    3. repeats: how often to run over all candidates
+    type: int
+Outputs:(Two)
+    1. best: lowest average time per candidate in milliseconds
+    type: float
+    2. warped: number of candidates that were rotated by the last run
+    type: int
+"""
+def time_per_candidate(correct, candidates, repeats):
+    best = float('inf')
+    warped = 0
+    for _ in range(repeats):
+        warped = 0
+        tic = time.perf_counter()
+        for image, mask in candidates:
+            corrected_image, _ = correct(image, mask)
+            if corrected_image is not image:
+                warped += 1
+        toc = time.perf_counter()
+        best = min(best, (toc - tic) / len(candidates) * 1000)
+    return best, warped
+
+
+"""
+Benchmark the hough and the moment based rotation correction on the plate candidates of the training and
+validation videos, and compare the localization score of both
+"""
+if __name__ == '__main__':
+    args = get_args()
+
+    candidates = []
+    for folder in ("training", "validation"):
+        if not os.path.isdir(folder):
+            continue
+        for f in sorted(os.listdir(folder)):
+            if f.endswith(".mp4"):
+                for _, _, frame in CaptureFrame_Process.frame_source(folder + "/" + f, args.sample_frequency):
+                    candidates += [(image, mask) for image, mask, _ in Localization.candidate_crops(frame)]
+    if len(candidates) == 0:
+        print("No plate candidates found in the training and validation videos")
+        sys.exit(1)
+
+    print(str(len(candidates)) + " plate candidates")
+    for name, correct in (("hough", Correction.correct_plate_hough), ("moments", Correction.correct_plate_moments)):
+        correct_time, warped = time_per_candidate(correct, candidates, args.repeats)
+        print(name + ": " + f"{correct_time:0.3f}" + " ms/candidate, " + str(warped) + " candidates rotated")
+
+    for deskew in ("hough", "moments"):
+        print("Localization with --deskew " + deskew)
+        options = Options(deskew=deskew)
+        for i in range(1, 5):
+            LocalizationEvaluation.evaluate_category_training(i, args.sample_frequency, options)
+            LocalizationEvaluation.evaluate_category_validation(i, args.sample_frequency, options)
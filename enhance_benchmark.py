@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+import Enhance
+import Recognize
+import RecognizeUtils
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, default='dataset/RecognitionTrainingSet')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    return args
+
+
+"""
+Time a function per image, taking the best of a number of repeats
+
+Inputs:(Three)
+    1. function: function to time, taking an image and an output array
+    type: function
+    2. images: pairs of an image and an output array of the right size to run the function on
+    type: list of pairs of arrays
+    3. repeats: how often to run over all images
+    type: int
+Outputs:(One)
+    1. best: lowest average time per image in microseconds
+    type: float
+"""
+def time_per_image(function, images, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        for image, out in images:
+            function(image, out)
+        toc = time.perf_counter()
+        best = min(best, (toc - tic) / len(images) * 1000000)
+    return best
+
+
+"""
+Benchmark the functions of Enhance on the plates of the recognition dataset, pre-processed like
+Recognize.segment_and_recognize does, with a new output array per call and with a reused one
+"""
+if __name__ == '__main__':
+    args = get_args()
+    plates = []
+    for category in sorted(os.listdir(args.dataset)):
+        folder = args.dataset + "/" + category
+        plates += [cv2.imread(folder + "/" + f) for f in sorted(os.listdir(folder)) if "plate" in f]
+    if len(plates) == 0:
+        print("No plates found in " + args.dataset)
+        sys.exit(1)
+
+    colour = [RecognizeUtils.resize_image(plate, 250, 70) for plate in plates]
+    grey = [Recognize.pre_process_image(plate) for plate in plates]
+    binary = [Enhance.binarize_adaptive(image) for image in grey]
+    functions = [
+        ("unsharp_mask", colour, lambda image, out: Enhance.unsharp_mask(image, out=out)),
+        ("contrast_stretching", grey, lambda image, out: Enhance.contrast_stretching(image, 0, 1, out)),
+        ("isodata_threshold", grey, lambda image, out: Enhance.isodata_threshold(image)),
+        ("invert_colours", binary, lambda image, out: Enhance.invert_colours(image, out)),
+        ("binarize", grey, lambda image, out: Enhance.binarize(image, 1, out)),
+        ("binarize_adaptive", grey, lambda image, out: Enhance.binarize_adaptive(image, out)),
+    ]
+
+    print(str(len(plates)) + " plates")
+    print('%20s' % 'function', '%12s' % 'new out', '%12s' % 'reused out')
+    for name, images, function in functions:
+        allocating = time_per_image(function, [(image, None) for image in images], args.repeats)
+        reusing = time_per_image(function, [(image, np.empty(image.shape, np.uint8)) for image in images], args.repeats)
+        print('%20s' % name, '%10.1f' % allocating + 'us', '%10.1f' % reusing + 'us')
+    print("Scratch buffers: " + str(Enhance.scratch))
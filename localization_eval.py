@@ -1,11 +1,15 @@
 import LocalizationEvaluation
 import argparse
+from Classes import Options
 from datetime import datetime
 
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--sample_freq', type=int, default=1)
+    parser.add_argument('--localization_scale', type=int, default=1)
+    parser.add_argument('--deskew', type=str, choices=['hough', 'moments'], default='hough')
+    parser.add_argument('--morphology', type=str, choices=['full', 'sparse'], default='full')
     args = parser.parse_args()
     return args
 
@@ -13,11 +17,12 @@ def get_args():
 if __name__ == '__main__':
     args = get_args()
     sample_freq = args.sample_freq
+    options = Options(localization_scale=args.localization_scale, deskew=args.deskew, morphology=args.morphology)
     print("Evaluation on training and testing datasets for categories 1-4.")
     print("This may take a while...")
     before = datetime.now()
     for i in range(1, 5):
-        LocalizationEvaluation.evaluate_category_training(i, sample_freq)
-        LocalizationEvaluation.evaluate_category_validation(i, sample_freq)
+        LocalizationEvaluation.evaluate_category_training(i, sample_freq, options)
+        LocalizationEvaluation.evaluate_category_validation(i, sample_freq, options)
     after = datetime.now()
     print("Evaluation took: " + str((after - before).seconds) + " seconds.")
@@ -1,6 +1,9 @@
 import argparse
 import os
 import CaptureFrame_Process
+import Batch
+import Recognize
+from Classes import Options
 import time
 
 # define the required arguments: video path(file_path), sample frequency(second), saving path for final result table
@@ -10,7 +13,36 @@ def get_args():
 	parser.add_argument('--file_path', type=str, default='dataset/TrainingsVideo.avi')
 	parser.add_argument('--output_path', type=str, default="Output.csv")
 	parser.add_argument('--sample_frequency', type=int, default=2)
+	parser.add_argument('--pipeline', type=str, choices=['serial', 'threaded', 'process'], default='serial')
+	parser.add_argument('--localize_workers', type=int, default=2)
+	parser.add_argument('--recognize_workers', type=int, default=2)
+	parser.add_argument('--queue_size', type=int, default=16)
+	parser.add_argument('--shards', type=int, default=1)
+	parser.add_argument('--sampling', type=str, choices=['fixed', 'adaptive'], default='fixed')
+	parser.add_argument('--sparse_stride', type=int, default=8)
+	parser.add_argument('--dense_patience', type=int, default=3)
+	parser.add_argument('--gate_threshold', type=float, default=0)
+	parser.add_argument('--track_interval', type=int, default=0)
+	parser.add_argument('--track_padding', type=float, default=0.5)
+	parser.add_argument('--localization_scale', type=int, default=1)
+	parser.add_argument('--deskew', type=str, choices=['hough', 'moments'], default='hough')
+	parser.add_argument('--morphology', type=str, choices=['full', 'sparse'], default='full')
+	parser.add_argument('--matcher', type=str, choices=['resize', 'packed'], default='resize')
+	parser.add_argument('--prune_top_k', type=int, default=0)
+	parser.add_argument('--cascade', type=str, choices=['fixed', 'adaptive'], default='fixed')
+	parser.add_argument('--hash_tolerance', type=int, default=-1)
+	parser.add_argument('--batch', type=str, default=None)
+	parser.add_argument('--batch_workers', type=int, default=os.cpu_count())
+	parser.add_argument('--output_dir', type=str, default='output')
 	args = parser.parse_args()
+	if args.hash_tolerance > Recognize.MAX_HASH_TOLERANCE:
+		parser.error('--hash_tolerance can be at most ' + str(Recognize.MAX_HASH_TOLERANCE))
+	if args.hash_tolerance >= 0 and args.pipeline == 'threaded':
+		# the threaded pipeline only knows the scenes once all plates are recognized
+		parser.error('--hash_tolerance is not supported with --pipeline threaded')
+	if args.track_interval > 0 and args.pipeline != 'serial':
+		# tracking needs the result of the previous frame before the next one is localized
+		parser.error('--track_interval is only supported with --pipeline serial')
 	return args
 
 
@@ -23,7 +55,19 @@ if __name__ == '__main__':
 		output_path = args.output_path
 	file_path = args.file_path
 	sample_frequency = args.sample_frequency
+	options = Options(pipeline=args.pipeline, localize_workers=args.localize_workers,
+					  recognize_workers=args.recognize_workers, queue_size=args.queue_size, shards=args.shards,
+					  sampling=args.sampling, sparse_stride=args.sparse_stride, dense_patience=args.dense_patience,
+					  gate_threshold=args.gate_threshold, track_interval=args.track_interval,
+					  track_padding=args.track_padding, localization_scale=args.localization_scale,
+					  deskew=args.deskew, morphology=args.morphology, matcher=args.matcher,
+					  prune_top_k=args.prune_top_k, cascade=args.cascade, hash_tolerance=args.hash_tolerance)
 	tic = time.perf_counter()
-	CaptureFrame_Process.CaptureFrame_Process(file_path, sample_frequency, output_path)
+	if args.batch is not None:
+		# process a directory or manifest of videos in one long-lived pool of workers
+		videos = Batch.read_batch(args.batch)
+		Batch.run_batch(videos, args.output_dir, sample_frequency, options, args.batch_workers)
+	else:
+		CaptureFrame_Process.CaptureFrame_Process(file_path, sample_frequency, output_path, options)
 	toc = time.perf_counter()
 	print(f"Completed license plate localization and recognition in {toc - tic:0.4f} seconds")
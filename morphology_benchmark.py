@@ -0,0 +1,83 @@
+import os
+import time
+import argparse
+import numpy as np
+import CaptureFrame_Process
+import LocalizationUtils
+import Morphology
+from Classes import Options
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_frequency', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    return args
+
+
+"""
+Time a denoising function per mask, taking the best of a number of repeats
+
+Inputs:(Three)
+    1. denoise: function denoising a mask
+    type: function
+    2. masks: masks to denoise
+    type: list of 2D arrays
+    3. repeats: how often to run over all masks
+    type: int
+Outputs:(One)
+    1. best: lowest average time per mask in milliseconds
+    type: float
+"""
+def time_per_mask(denoise, masks, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        for mask in masks:
+            denoise(mask)
+        toc = time.perf_counter()
+        best = min(best, (toc - tic) / len(masks) * 1000)
+    return best
+
+
+"""
+Intersection over union of the foreground of two masks
+
+Inputs:(Two)
+    1. mask: first mask
+    type: 2D array
+    2. other: second mask
+    type: 2D array
+Outputs:(One)
+    1. iou: intersection over union, 1 if both masks are empty
+    type: float
+"""
+def iou(mask, other):
+    union = np.count_nonzero((mask > 0) | (other > 0))
+    if union == 0:
+        return 1
+    return np.count_nonzero((mask > 0) & (other > 0)) / union
+
+
+"""
+Benchmark the sparse morphology against the full frame morphology of Morphology.denoise
+on the yellow masks of the training and validation videos
+"""
+if __name__ == '__main__':
+    args = get_args()
+    sparse = Options(morphology='sparse')
+    for folder in ("training", "validation"):
+        if not os.path.isdir(folder):
+            continue
+        for f in sorted(os.listdir(folder)):
+            if not f.endswith(".mp4"):
+                continue
+            video = folder + "/" + f
+            masks = [LocalizationUtils.yellow_mask(frame) for _, _, frame in
+                     CaptureFrame_Process.frame_source(video, args.sample_frequency)]
+            full_time = time_per_mask(lambda mask: Morphology.denoise(mask), masks, args.repeats)
+            sparse_time = time_per_mask(lambda mask: Morphology.denoise(mask, 1, sparse), masks, args.repeats)
+            ious = [iou(Morphology.denoise(mask), Morphology.denoise(mask, 1, sparse)) for mask in masks]
+            print(video + ": full " + f"{full_time:0.2f}" + " ms/frame, sparse " + f"{sparse_time:0.2f}"
+                  + " ms/frame, IoU min " + f"{min(ious):0.4f}" + " mean " + f"{np.mean(ious):0.4f}")
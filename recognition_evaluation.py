@@ -3,11 +3,15 @@ import cv2
 from json import load
 import argparse
 import Recognize
+from Classes import Options
 
 
 def get_args():
 	parser = argparse.ArgumentParser()
 	parser.add_argument('--print', type=bool, default=False)
+	parser.add_argument('--matcher', type=str, choices=['resize', 'packed'], default='resize')
+	parser.add_argument('--prune_top_k', type=int, default=0)
+	parser.add_argument('--cascade', type=str, choices=['fixed', 'adaptive'], default='fixed')
 	args = parser.parse_args()
 	return args
 
@@ -30,13 +34,19 @@ def read_labels(file_path):
 """
 Calculate the recognition evaluation score of data in a folder.
 
-Inputs:(One)
+Inputs:(Four)
 	1. file_path: path to folder containing images of plates and json file of labels
 	type: string
+	2. training_data: whether the folder holds training data, only then the results are printed
+	type: boolean
+	3. print_all: whether to print the result for each plate
+	type: boolean
+	4. options: recognition options, None for the defaults
+	type: Options
 Ouputs:(One)
 	1. score: evaluation score of recognition (value between 0 and 100)
 """
-def recognition_score(file_path, training_data, print_all = True):
+def recognition_score(file_path, training_data, print_all = True, options = None):
 	labels = None
 	images = {}
 	# reading images and labels into maps
@@ -49,7 +59,7 @@ def recognition_score(file_path, training_data, print_all = True):
 
 	correctly_recognized = 0
 	for filename, label in labels.items():
-		actual = Recognize.segment_and_recognize(images[filename])
+		actual = Recognize.segment_and_recognize(images[filename], options=options)
 		if actual is None:
 			continue
 		if actual == label:
@@ -69,21 +79,24 @@ def recognition_score(file_path, training_data, print_all = True):
 Evaluate recognition
 """
 if __name__ == '__main__':
-	print_all = get_args().print
+	args = get_args()
+	print_all = args.print
+	options = Options(matcher=args.matcher, prune_top_k=args.prune_top_k, cascade=args.cascade)
 	print("Evaluating recognition...")
-	training_score_1 = recognition_score('dataset/RecognitionTrainingSet/category1', True, print_all)
+	training_score_1 = recognition_score('dataset/RecognitionTrainingSet/category1', True, print_all, options)
 	print("Training score category 1: " + str(training_score_1) + "%")
-	training_score_2 = recognition_score('dataset/RecognitionTrainingSet/category2', True, print_all)
+	training_score_2 = recognition_score('dataset/RecognitionTrainingSet/category2', True, print_all, options)
 	print("Training score category 2: " + str(training_score_2) + "%")
-	training_score_3 = recognition_score('dataset/RecognitionTrainingSet/category3', True, print_all)
+	training_score_3 = recognition_score('dataset/RecognitionTrainingSet/category3', True, print_all, options)
 	print("Training score category 3: " + str(training_score_3) + "%")
-	training_score_4 = recognition_score('dataset/RecognitionTrainingSet/category4', True, print_all)
+	training_score_4 = recognition_score('dataset/RecognitionTrainingSet/category4', True, print_all, options)
 	print("Training score category 4: " + str(training_score_4) + "%")
-	validation_score_1 = recognition_score('dataset/RecognitionValidationSet/category1', False, print_all)
+	validation_score_1 = recognition_score('dataset/RecognitionValidationSet/category1', False, print_all, options)
 	print("Validation score category 1: " + str(validation_score_1) + "%")
-	validation_score_2 = recognition_score('dataset/RecognitionValidationSet/category2', False, print_all)
+	validation_score_2 = recognition_score('dataset/RecognitionValidationSet/category2', False, print_all, options)
 	print("Validation score category 2: " + str(validation_score_2) + "%")
-	validation_score_3 = recognition_score('dataset/RecognitionValidationSet/category3', False, print_all)
+	validation_score_3 = recognition_score('dataset/RecognitionValidationSet/category3', False, print_all, options)
 	print("Validation score category 3: " + str(validation_score_3) + "%")
-	validation_score_4 = recognition_score('dataset/RecognitionValidationSet/category4', False, print_all)
+	validation_score_4 = recognition_score('dataset/RecognitionValidationSet/category4', False, print_all, options)
 	print("Validation score category 4: " + str(training_score_4) + "%")
+	print("Recognition strategies: " + str(Recognize.cascade))